@@ -4,11 +4,16 @@
 
 """A Grafana Mimir Charm.
 
-This charm deploys Mimir in Monolithic mode.
+This charm deploys Mimir in Monolithic mode by default. Alternatively
+each application may run a subset of Mimir components, in which case
+applications discover each other over the mimir-cluster relations.
 """
 
+import functools
+import hashlib
 import logging
 import socket
+import time
 
 import yaml
 from charms.grafana_k8s.v0.grafana_source import GrafanaSourceProvider
@@ -18,43 +23,117 @@ from charms.prometheus_k8s.v0.prometheus_remote_write import (
 )
 from charms.traefik_k8s.v0.ingress import IngressPerAppRequirer
 from ops.charm import CharmBase
+from ops.framework import StoredState
 from ops.main import main
-from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
+from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus, WaitingStatus
 
 from mimir.alertmanager import (
     DEFAULT_ALERT_TEMPLATE,
     DEFAULT_ALERTMANAGER_CONFIG,
     AlertManager,
 )
+from mimir.api import MimirAPI
+from mimir.cgroup import cpu_limit, memory_limit
+from mimir.cluster import MimirCluster
 from mimir.config import (
+    MEMBERLIST_DISCOVERY_MODES,
+    MEMCACHED_PORTS,
     MIMIR_CONFIG_FILE,
     MIMIR_DIRS,
+    MIMIR_GRPC_PORT,
+    MIMIR_MEMBERLIST_PORT,
     MIMIR_PORT,
     MIMIR_PUSH_PATH,
+    MIMIR_READY_PATH,
+    MIMIR_RUNTIME_CONFIG_FILE,
     alertmanager_storage_config,
     block_storage_config,
+    bucket_index_config,
+    bucket_store_config,
+    cache_config,
     compactor_config,
     distributor_config,
+    distributor_instance_limits,
     frontend_config,
+    frontend_worker_config,
+    go_runtime_environment,
     ingester_config,
+    ingester_instance_limits,
+    limits_config,
     memberlist_config,
+    parse_duration,
+    querier_config,
+    querier_lookback,
+    query_scheduler_config,
+    replication_factor,
+    ring_config,
     ruler_config,
     ruler_storage_config,
+    runtime_config,
+    runtime_overrides_config,
     server_config,
     store_gateway_config,
+    target_components,
+    tenant_overrides,
+    tsdb_config,
 )
+from mimir.kubernetes import (
+    KubernetesHeadlessService,
+    KubernetesStatefulSetPatch,
+    node_zone,
+    pod_anti_affinity,
+    resource_requirements,
+    topology_spread_constraints,
+)
+from mimir.memcached import Memcached, memcached_command
+from mimir.profiles import profile_options
+from mimir.restart import RollingRestart
 
 logger = logging.getLogger(__name__)
 
 
+def _content_hash(content):
+    """Hash of a configuration file content.
+
+    Args:
+        content: string content of a configuration file.
+
+    Returns:
+        A hex digest string uniquely identifying the content.
+    """
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _config_defaults(path):
+    """Default values of charm configuration options.
+
+    Args:
+        path: string path of the charm configuration file.
+
+    Returns:
+        A mapping from option names to default values.
+    """
+    with open(path) as f:
+        options = yaml.safe_load(f)["options"]
+
+    return {name: option.get("default") for name, option in options.items()}
+
+
 class MimirCharm(CharmBase):
     """A Monolithic Mimir charm."""
 
+    _stored = StoredState()
+
     def __init__(self, *args):
         super().__init__(*args)
+        self._stored.set_default(peers_changed=False, peers_unsettled_since=0.0, zone="")
         self._name = "mimir"
+        self._container_limits = None
+        self._tuned_options = None
         self._peername = "mimir-peers"
         self._alertmanager = AlertManager()
+        self._mimir_api = MimirAPI()
 
         # Ingress handler
         self.ingress = IngressPerAppRequirer(self, host=self._name, port=MIMIR_PORT)
@@ -62,20 +141,56 @@ class MimirCharm(CharmBase):
         self.framework.observe(self.ingress.on.revoked, self._on_ingress_changed)
 
         # Kubernetes service patcher
-        self.service_patcher = KubernetesServicePatch(self, [(f"{self.app.name}", MIMIR_PORT)])
-
-        # library objects for managing charm relations
-        self.remote_write_provider = PrometheusRemoteWriteProvider(
-            self, endpoint_port=MIMIR_PORT, endpoint_path=MIMIR_PUSH_PATH
+        self.service_patcher = KubernetesServicePatch(
+            self, [(f"{self.app.name}", MIMIR_PORT), ("grpc", MIMIR_GRPC_PORT)]
+        )
+        self.memberlist_service = KubernetesHeadlessService(
+            self, f"{self.app.name}-memberlist", [("memberlist", MIMIR_MEMBERLIST_PORT)]
         )
-        self.grafana_source_provider = GrafanaSourceProvider(
-            self, source_type="prometheus", source_url=self._grafana_source_url
+        self.statefulset_patch = KubernetesStatefulSetPatch(self, pod_spec=self._pod_spec_patch)
+
+        # Mimir restarts coordinated across peer units
+        self.restarter = RollingRestart(
+            self,
+            self._peername,
+            restart=self._restart_mimir,
+            is_ready=self._mimir_api.is_ready,
+            max_parallel=self.config["max_parallel_restarts"],
         )
 
+        # memcached servers caching Mimir data
+        self.memcached = Memcached(self, "memcached", servers=self._memcached_servers)
+
+        # Mimir applications running other components
+        self.cluster = MimirCluster(
+            self,
+            ["mimir-cluster", "mimir-cluster-join"],
+            hostname=str(self.hostname),
+            components=self._components,
+            service_address=f"{self.app.name}.{self.model.name}.svc.cluster.local",
+            memberlist_address=self.memberlist_service.address,
+        )
+        self.framework.observe(self.cluster.on.cluster_changed, self._on_cluster_changed)
+
+        # library objects for managing charm relations, only provided
+        # by units running the Mimir components that serve them
+        self.remote_write_provider = None
+        if "distributor" in self._components:
+            self.remote_write_provider = PrometheusRemoteWriteProvider(
+                self, endpoint_port=MIMIR_PORT, endpoint_path=MIMIR_PUSH_PATH
+            )
+        self.grafana_source_provider = None
+        if self._components & {"querier", "query-frontend"}:
+            self.grafana_source_provider = GrafanaSourceProvider(
+                self, source_type="prometheus", source_url=self._grafana_source_url
+            )
+
         # charm lifecycle event handlers
         self.framework.observe(self.on.mimir_pebble_ready, self._on_mimir_pebble_ready)
         self.framework.observe(self.on.config_changed, self._on_config_changed)
         self.framework.observe(self.on.upgrade_charm, self._on_upgrade_charm)
+        self.framework.observe(self.on.update_status, self._on_update_status)
+        self.framework.observe(self.on.stop, self._on_stop)
         self.framework.observe(
             self.on.receive_remote_write_relation_changed,
             self._on_remote_write_relation_changed,
@@ -96,7 +211,7 @@ class MimirCharm(CharmBase):
             self.on[self._peername].relation_departed, self._on_peer_relation_departed
         )
 
-    def _on_mimir_pebble_ready(self, event):
+    def _on_mimir_pebble_ready(self, _):
         """Define and start a workload using the Pebble API.
 
         When a new Mimir workload container starts the, all
@@ -104,34 +219,16 @@ class MimirCharm(CharmBase):
         config file is created and then the Mimir workload is
         started. Also the Mimir Alertmanager configuration is set.
         """
-        self._create_mimir_dirs()
-        self._set_mimir_config()
-
-        # Get a reference the container attribute on the PebbleReadyEvent
-        container = event.workload
-        # Define an initial Pebble layer configuration
-        pebble_layer = {
-            "summary": "mimir layer",
-            "description": "pebble config layer for mimir",
-            "services": {
-                self._name: {
-                    "override": "replace",
-                    "summary": self._name,
-                    "command": f"mimir -target=all,alertmanager --config.file {MIMIR_CONFIG_FILE}",
-                    "startup": "enabled",
-                }
-            },
-        }
-        # Add initial Pebble config layer using the Pebble API
-        container.add_layer(self._name, pebble_layer, combine=True)
-        container.start(self._name)
-
+        mimir_configured = self._configure_mimir()
         self._set_alertmanager_config()
-        self.unit.status = ActiveStatus()
+
+        if mimir_configured:
+            self._set_ready_status()
 
     def _on_ingress_changed(self, _):
         """Update Grafana source on ingress changed."""
-        self.grafana_source_provider.update_source(self._grafana_source_url)
+        if self.grafana_source_provider:
+            self.grafana_source_provider.update_source(self._grafana_source_url)
 
     def _on_config_changed(self, _):
         """Handle Mimir configuration change.
@@ -141,12 +238,11 @@ class MimirCharm(CharmBase):
         it is check if replication has been enabled without object
         storage and in this case blocked status is set.
         """
-        self._set_mimir_config()
+        mimir_configured = self._configure_mimir()
         self._set_alertmanager_config()
-        mimir_restarted = self._restart_mimir()
 
-        if mimir_restarted:
-            self.unit.status = ActiveStatus()
+        if mimir_configured:
+            self._set_ready_status()
 
         if self.app.planned_units() > 1 and not self.config.get("s3", ""):
             self.unit.status = BlockedStatus("Replication requires object storage")
@@ -155,26 +251,23 @@ class MimirCharm(CharmBase):
         """Handle charm upgrades.
 
         In response to charm upgrade a Mimir configuration
-        is regenerated and Mimir restarted.
+        is regenerated and Mimir restarted if the configuration
+        or Pebble layer has changed.
         """
-        container = self.unit.get_container(self._name)
-
-        if not container.can_connect():
-            self.unit.status = WaitingStatus("Waiting for Pebble ready")
-            return
-        self._set_mimir_config()
-        mimir_restarted = self._restart_mimir()
-
-        if mimir_restarted:
-            self.unit.status = ActiveStatus()
+        if self._configure_mimir():
+            self._set_ready_status()
 
     def _on_remote_write_relation_changed(self, _):
         """Handle change with remote write consumers.
 
         In response to changes with remote write consumers,
         Mimir's alert rules are updated to the current set of
-        alert rules provided by all remote write consumers.
+        alert rules provided by all remote write consumers, if this
+        unit runs both a distributor and a ruler.
         """
+        if not self._serves_alert_rules:
+            return
+
         container = self.unit.get_container(self._name)
 
         if not container.can_connect():
@@ -186,6 +279,9 @@ class MimirCharm(CharmBase):
             self._set_alert_rules(alerts["groups"])
 
     def _on_remote_write_relation_broken(self, event):
+        if not self._serves_alert_rules:
+            return
+
         container = self.unit.get_container(self._name)
 
         if not container.can_connect():
@@ -223,56 +319,440 @@ class MimirCharm(CharmBase):
         """Handle changes in peer relations.
 
         In response to changes in peer relation a new Mimir
-        configuration is set and Mimir restarted.
+        configuration is set and Mimir restarted if the
+        configuration has changed. While the application is
+        scaling the new configuration is deferred until all
+        planned peers are known.
         """
-        logger.debug("New memberlist : %s", memberlist_config(self.unit.name, self.peers))
-        self._set_mimir_config()
-        self._restart_mimir()
+        if not self._reconfigure_peers():
+            return
 
         if self.app.planned_units() == 1 or self.config.get("s3", ""):
-            self.unit.status = ActiveStatus()
+            self._set_ready_status()
 
-    def _on_peer_relation_departed(self, _):
+    def _on_peer_relation_departed(self, event):
         """Handle peer relation departed.
 
         In response to a peer relation departing a new Mimir
-        configuration is set and Mimir restarted.
+        configuration is set and Mimir restarted if the
+        configuration has changed. While the application is
+        scaling the new configuration is deferred until all
+        planned peers are known. If this unit is the one that
+        is departing its ingester is shut down gracefully.
         """
-        logger.debug("New memberlist : %s", memberlist_config(self.unit.name, self.peers))
-        self._set_mimir_config()
-        self._restart_mimir()
+        if event.departing_unit == self.unit:
+            self._shutdown_ingester()
+            return
+
+        if not self._reconfigure_peers():
+            return
 
         if self.app.planned_units() == 1 or self.config.get("s3", ""):
-            self.unit.status = ActiveStatus()
+            self._set_ready_status()
 
-    def _restart_mimir(self):
-        """Restart Mimir workload."""
+    def _on_stop(self, _):
+        """Handle the Mimir unit being stopped.
+
+        A unit being removed while the application scales down
+        shuts down its ingester gracefully. Other units, for instance
+        those being rescheduled, are stopped as is since they keep
+        their write ahead log and ring tokens.
+        """
+        if self._unit_number >= self.app.planned_units():
+            self._shutdown_ingester()
+
+    def _shutdown_ingester(self):
+        """Flush the Mimir ingester and have it leave the ring.
+
+        In-memory series are flushed and shipped to the blocks
+        storage, so that they are not lost with the unit, and the
+        ingester leaves the ring, so that the remaining ingesters
+        take over its series immediately. Mimir is then stopped so
+        that Pebble does not restart the ingester.
+        """
+        container = self.unit.get_container(self._name)
+
+        if "ingester" not in self._components or not container.can_connect():
+            return
+
+        # the Mimir service is not defined if Mimir was never configured
+        service = container.get_services(self._name).get(self._name)
+        if not service or not service.is_running():
+            return
+
+        self.unit.status = MaintenanceStatus("Flushing ingester")
+        timeout = self.config["ingester_shutdown_timeout"]
+        if self._mimir_api.shutdown_ingester(timeout=timeout):
+            logger.info("Mimir ingester flushed and left the ring")
+        else:
+            logger.warning("Mimir ingester failed to shut down within %ss", timeout)
+
+        container.stop(self._name)
+
+    def _on_cluster_changed(self, _):
+        """Handle changes in other Mimir applications of the cluster.
+
+        Mimir is reconfigured, and restarted if the configuration
+        changed, whenever the applications running other Mimir
+        components change.
+        """
+        if self._configure_mimir():
+            self._set_ready_status()
+
+    def _on_update_status(self, _):
+        """Handle periodic status updates.
+
+        Peer changes deferred while the application was scaling
+        are applied and the unit status is refreshed to reflect
+        whether Mimir has become ready since the last hook.
+        """
+        if self._stored.peers_changed:
+            valid = self._reconfigure_peers()
+        elif error := self._config_error():
+            self.unit.status = BlockedStatus(error)
+            valid = False
+        else:
+            valid = True
+
+        if not valid or (self.app.planned_units() > 1 and not self.config.get("s3", "")):
+            return
+
+        if self.unit.get_container(self._name).can_connect():
+            self._set_ready_status()
+
+    def _set_ready_status(self):
+        """Set active status only once Mimir is ready to serve requests.
+
+        After a start or restart Mimir may take minutes, for instance
+        replaying its write ahead log, before it is ready to accept
+        writes. Until then the unit is reported as waiting. The charm
+        configuration must have been validated in the same hook.
+        """
+        if self._mimir_api.is_ready():
+            if self._bucket_index_stale():
+                self.unit.status = ActiveStatus("Bucket index is stale")
+            else:
+                self.unit.status = ActiveStatus()
+        else:
+            self.unit.status = WaitingStatus("Waiting for Mimir to become ready")
+
+    def _bucket_index_stale(self):
+        """Check if the compactor of this unit fails to update bucket indexes.
+
+        Queries of a tenant fail once its bucket index has not been
+        updated for longer than the bucket index max stale period.
+
+        Returns:
+            True if this unit runs a compactor and the bucket index of
+            any tenant has not been updated within the max stale period.
+        """
+        if "compactor" not in self._components:
+            return False
+
+        if not (updated_at := self._mimir_api.bucket_index_updated_at()):
+            return False
+
+        max_stale_period = parse_duration(self.config["bucket_index_max_stale_period"])
+        return time.time() - min(updated_at.values()) > max_stale_period
+
+    def _reconfigure_peers(self):
+        """Reconfigure Mimir for the current set of peers once it has settled.
+
+        Scaling an application causes a burst of peer relation
+        events on every unit. Reconfiguring Mimir for each of these
+        would restart every unit once per new peer. Instead Mimir is
+        only reconfigured once the number of peers that have shared
+        their hostname matches the number of planned units, or the
+        peer settle timeout has expired.
+
+        Returns:
+            True if the charm configuration is valid and Mimir was
+            reconfigured or its reconfiguration deferred, False otherwise.
+        """
+        if not self._peers_settled():
+            self._stored.peers_changed = True
+            logger.debug(
+                "Deferring reconfiguration, %d of %d peers known",
+                len(self.peers),
+                self.app.planned_units(),
+            )
+            if error := self._config_error():
+                self.unit.status = BlockedStatus(error)
+                return False
+            return True
+
+        self._stored.peers_changed = False
+        logger.debug("Reconfiguring Mimir for %d peers", len(self.peers))
+        return self._configure_mimir()
+
+    def _peers_settled(self):
+        """Check if the set of peers is stable enough to reconfigure Mimir.
+
+        Returns:
+            True if all planned peers are known or if the peer settle
+            timeout expired since the peers were first found unsettled.
+        """
+        if len(self.peers) == self.app.planned_units():
+            self._stored.peers_unsettled_since = 0.0
+            return True
+
+        now = time.time()
+        if not self._stored.peers_unsettled_since:
+            self._stored.peers_unsettled_since = now
+            return False
+
+        if now - self._stored.peers_unsettled_since < self.config["peer_settle_timeout"]:
+            return False
+
+        logger.warning("Peer settle timeout expired, reconfiguring with known peers")
+        self._stored.peers_unsettled_since = 0.0
+        return True
+
+    def _configure_mimir(self):
+        """Bring the Mimir workload in line with the current charm state.
+
+        The Mimir configuration file and Pebble layer are only
+        updated if they differ from those already present in the
+        workload container, and Mimir is only restarted if either
+        of them changed. This avoids needless restarts, which force
+        Mimir ingesters to replay their write ahead log. Restarts are
+        rolled across peer units so that only a limited number of
+        units are restarting at any time.
+
+        The configuration is validated by rendering it once, and the
+        rendered files and layer are the ones applied.
+
+        Returns:
+            True if the workload container was reachable and the charm
+            configuration is valid, False otherwise.
+        """
         container = self.unit.get_container(self._name)
 
         if not container.can_connect():
             self.unit.status = WaitingStatus("Waiting for Pebble ready")
             return False
 
-        container.stop(self._name)
-        container.start(self._name)
+        try:
+            mimir_config, runtime_config, layer = self._render_workload()
+        except ValueError as e:
+            self.unit.status = BlockedStatus(str(e))
+            return False
+
+        if self.unit.is_leader():
+            self._publish_replication_factor()
+
+        self._create_mimir_dirs()
+        self._push_if_changed(container, MIMIR_RUNTIME_CONFIG_FILE, runtime_config)
+        config_changed = self._push_if_changed(container, MIMIR_CONFIG_FILE, mimir_config)
+        layer_changed = self._set_pebble_layer(layer)
+
+        service = container.get_service(self._name)
+        if not service.is_running():
+            container.replan()
+        elif config_changed or layer_changed:
+            self.restarter.request_restart()
 
         return True
 
-    def _set_mimir_config(self):
-        """Generate and set a Mimir workload configuration."""
+    def _publish_replication_factor(self):
+        """Share the replication factor to be used by all units.
+
+        All units must agree on the replication factor of Mimir
+        rings, otherwise distributors would disagree on the number
+        of ingesters required for a successful write. Hence only the
+        leader computes the replication factor, from the number of
+        planned units and the replication_factor option, and shares it
+        with peers, which then apply it through rolling restarts.
+        """
+        if not self.peer_relation:
+            return
+
+        factor = replication_factor(self.app.planned_units(), self.config["replication_factor"])
+        app_data = self.peer_relation.data[self.app]
+        if app_data.get("replication_factor") != str(factor):
+            logger.info("Setting Mimir replication factor to %d", factor)
+            app_data["replication_factor"] = str(factor)
+
+    def _restart_mimir(self):
+        """Restart Mimir workload."""
         container = self.unit.get_container(self._name)
 
         if not container.can_connect():
             self.unit.status = WaitingStatus("Waiting for Pebble ready")
             return False
 
-        # push mimr config file to workload
-        mimir_config = self._mimir_config()
-        container.push(MIMIR_CONFIG_FILE, mimir_config, make_dirs=True)
-        logger.info("Set new Mimir configuration")
+        container.restart(self._name)
 
         return True
 
+    def _push_if_changed(self, container, path, content):
+        """Push a file to the workload container if its content changed.
+
+        Args:
+            container: the Mimir workload container.
+            path: string path of the file in the container.
+            content: string content of the file.
+
+        Returns:
+            True if the file was pushed, False if the container already
+            has a file at this path with the same content hash.
+        """
+        content_hash = _content_hash(content)
+        if content_hash == self._current_file_hash(container, path):
+            logger.debug("%s %s is unchanged", path, content_hash)
+            return False
+
+        container.push(path, content, make_dirs=True)
+        logger.info("Set new %s %s", path, content_hash)
+
+        return True
+
+    def _current_file_hash(self, container, path):
+        """Hash of a file in the workload container.
+
+        Args:
+            container: the Mimir workload container.
+            path: string path of the file in the container.
+
+        Returns:
+            A string hash of the current file content, or None if
+            there is no such file in the container.
+        """
+        if not container.exists(path):
+            return None
+
+        return _content_hash(container.pull(path).read())
+
+    def _set_pebble_layer(self, layer):
+        """Set the Mimir Pebble layer.
+
+        The layer is always added since changes to health checks
+        take effect without a restart. Mimir only needs a restart if
+        its service definition has changed.
+
+        Args:
+            layer: a dictionary Pebble layer, as built by :meth:`_pebble_layer`.
+
+        Returns:
+            True if the Mimir service definition changed, False otherwise.
+        """
+        container = self.unit.get_container(self._name)
+
+        current_service = container.get_plan().services.get(self._name)
+        service_changed = (
+            not current_service or current_service.to_dict() != layer["services"][self._name]
+        )
+        container.add_layer(self._name, layer, combine=True)
+
+        if service_changed:
+            logger.info("Set new Mimir Pebble layer")
+
+        return service_changed
+
+    def _pebble_layer(self):
+        """Generate the Pebble layer for the Mimir workload.
+
+        The layer defines a readiness check against the Mimir
+        ready endpoint and a liveness check against the Mimir HTTP
+        port. Readiness is not used for liveness since Mimir is not
+        ready while replaying its write ahead log, and restarting it
+        then would only restart the replay.
+
+        The service environment tunes the Go runtime to the resource
+        limits of the Mimir container.
+        """
+        cpus, memory = self._resource_limits
+        environment = go_runtime_environment(
+            cpus=cpus,
+            memory=memory,
+            gomaxprocs=self.config["go_max_procs"],
+            gomemlimit=self.config["go_memory_limit"],
+            gogc=self.config["go_gc"],
+        )
+
+        return {
+            "summary": "mimir layer",
+            "description": "pebble config layer for mimir",
+            "services": {
+                self._name: {
+                    "override": "replace",
+                    "summary": self._name,
+                    "command": f"mimir -target={self.config['target']} --config.file {MIMIR_CONFIG_FILE}",
+                    "startup": "enabled",
+                    "environment": environment,
+                    "on-check-failure": {"mimir-alive": "restart"},
+                }
+            },
+            "checks": {
+                "mimir-ready": {
+                    "override": "replace",
+                    "level": "ready",
+                    "period": "10s",
+                    "threshold": 3,
+                    "http": {"url": f"http://localhost:{MIMIR_PORT}{MIMIR_READY_PATH}"},
+                },
+                "mimir-alive": {
+                    "override": "replace",
+                    "level": "alive",
+                    "period": "30s",
+                    "threshold": 5,
+                    "tcp": {"port": MIMIR_PORT},
+                },
+            },
+        }
+
+    def _pod_spec_patch(self):
+        """Generate the patch of the pod spec of Mimir units.
+
+        Raises:
+            ValueError: if a resource or scheduling configuration
+                option is invalid.
+        """
+        resources = resource_requirements(
+            cpu_request=self.config["cpu_request"],
+            memory_request=self.config["memory_request"],
+            cpu_limit=self.config["cpu_limit"],
+            memory_limit=self.config["memory_limit"],
+        )
+
+        return {
+            "containers": [{"name": self._name, "resources": resources}],
+            "affinity": {
+                "podAntiAffinity": pod_anti_affinity(
+                    self.app.name, self.config["pod_anti_affinity"]
+                )
+            },
+            "topologySpreadConstraints": topology_spread_constraints(
+                self.app.name, self.config["topology_spread_max_skew"]
+            ),
+        }
+
+    def _zone(self):
+        """Availability zone of this unit if zone awareness is enabled.
+
+        The zone is read from the labels of the node this unit runs on
+        and is remembered for the lifetime of the unit pod.
+
+        Returns:
+            The string zone of this unit, or None if zone awareness
+            is disabled.
+
+        Raises:
+            ValueError: if zone awareness is enabled but the zone of
+                this unit can not be determined.
+        """
+        if not self.config["zone_awareness"]:
+            return None
+
+        if not self._stored.zone:
+            pod_name = self.unit.name.replace("/", "-")
+            self._stored.zone = node_zone(pod_name, self.model.name) or ""
+
+        if not self._stored.zone:
+            raise ValueError("Zone awareness requires a node zone label and `juju trust`")
+
+        return self._stored.zone
+
     def _create_mimir_dirs(self):
         """Create Mimir directories.
 
@@ -293,28 +773,366 @@ class MimirCharm(CharmBase):
 
         return True
 
+    def _config_error(self):
+        """Validate the charm configuration.
+
+        Returns:
+            A string describing the first invalid configuration option
+            found, or an empty string if the configuration is valid.
+        """
+        try:
+            self._render_workload()
+        except ValueError as e:
+            return str(e)
+
+        return ""
+
+    def _render_workload(self):
+        """Render the Mimir workload configuration from the charm configuration.
+
+        Configuration of the memcached sidecar and of the pod spec is
+        also rendered, so that any invalid option is found.
+
+        Returns:
+            A tuple of the Mimir configuration, the Mimir runtime
+            configuration and the Mimir Pebble layer.
+
+        Raises:
+            ValueError: if a configuration option is invalid.
+        """
+        target_components(self.config["target"])
+        mimir_config = self._mimir_config()
+        runtime_config = self._runtime_config()
+        self._memcached_servers()
+        layer = self._pebble_layer()
+        self._pod_spec_patch()
+
+        return mimir_config, runtime_config, layer
+
     def _mimir_config(self) -> str:
-        """Generate a Mimir workload configuration."""
+        """Generate a Mimir workload configuration.
+
+        Raises:
+            ValueError: if a configuration option is invalid.
+        """
+        options = self._tuned_config()
         s3_config = yaml.safe_load(self.config.get("s3", "{}"))
         retention_period = self.config.get("tsdb_block_retention_period", "24h")
+        tsdb = tsdb_config(
+            memory_snapshot_on_shutdown=options["tsdb_memory_snapshot_on_shutdown"],
+            wal_replay_concurrency=options["tsdb_wal_replay_concurrency"],
+            wal_segment_size=options["tsdb_wal_segment_size"],
+            wal_compression=options["tsdb_wal_compression"],
+            head_compaction_interval=options["tsdb_head_compaction_interval"],
+            # blocks are shipped less often when storage is local
+            ship_interval=options["tsdb_ship_interval"] or ("1m" if s3_config else "5m"),
+        )
+
+        bucket_store = bucket_store_config(
+            sync_interval=options["store_gateway_sync_interval"],
+            block_sync_concurrency=options["store_gateway_block_sync_concurrency"],
+            lazy_loading=options["store_gateway_lazy_loading"],
+            lazy_loading_idle_timeout=options["store_gateway_lazy_loading_idle_timeout"],
+            max_concurrent=options["store_gateway_max_concurrent"],
+            max_chunk_pool_bytes=options["store_gateway_max_chunk_pool_bytes"],
+            bucket_index=bucket_index_config(
+                update_interval=options["bucket_index_update_interval"],
+                idle_timeout=options["bucket_index_idle_timeout"],
+                max_stale_period=options["bucket_index_max_stale_period"],
+            ),
+        )
+
+        _, query_store_after = self._querier_lookback()
+        querier = querier_config(
+            max_concurrent=options["querier_max_concurrent"],
+            query_store_after=query_store_after,
+            max_samples=options["querier_max_samples"],
+            prefer_streaming_chunks=options["querier_prefer_streaming_chunks"],
+        )
 
+        instance_addr = str(self.hostname)
+        _, memory = self._resource_limits
+        ingester_limits = ingester_instance_limits(
+            memory_limit=memory,
+            max_series=options["ingester_max_series"],
+            max_tenants=options["ingester_max_tenants"],
+            max_inflight_push_requests=options["ingester_max_inflight_push_requests"],
+            max_ingestion_rate=options["ingester_max_ingestion_rate"],
+        )
+        distributor_limits = distributor_instance_limits(
+            memory_limit=memory,
+            max_inflight_push_requests=options["distributor_max_inflight_push_requests"],
+            max_ingestion_rate=options["distributor_max_ingestion_rate"],
+        )
+
+        caches = self._caches()
+        results_cache = caches.pop("results", None)
+        if addresses := options["query_results_cache_addresses"]:
+            results_cache = cache_config(
+                addresses, max_item_size=options["results_cache_max_item_size"]
+            )
+        frontend = frontend_config(
+            self._frontend_peers,
+            results_cache=results_cache,
+            split_queries_by_interval=options["query_split_interval"],
+            parallelize_shardable_queries=options["query_sharding"],
+            max_outstanding_per_tenant=options["query_max_outstanding_requests_per_tenant"],
+        )
+
+        ring = ring_config(
+            heartbeat_period=options["ring_heartbeat_period"],
+            heartbeat_timeout=options["ring_heartbeat_timeout"],
+        )
+
+        alertmanager_host = "localhost"
+        if "alertmanager" not in self._components:
+            alertmanager_host = self.cluster.service_address("alertmanager") or alertmanager_host
+
+        # ring and storage configuration is shared by all components
+        # so it is set irrespective of the components run by this unit
         config = {
             "multitenancy_enabled": False,
-            "blocks_storage": block_storage_config(s3_config, retention_period),
-            "frontend": frontend_config(self.peers),
-            "compactor": compactor_config(),
-            "distributor": distributor_config(),
-            "ingester": ingester_config(),
-            "ruler": ruler_config(),
+            "blocks_storage": block_storage_config(
+                s3_config,
+                retention_period,
+                tsdb,
+                caches={f"{name}_cache": cache for name, cache in caches.items()},
+                bucket_store=bucket_store,
+            ),
+            "frontend": frontend,
+            "compactor": compactor_config(
+                instance_addr,
+                cleanup_interval=options["bucket_index_update_interval"],
+                compaction_concurrency=options["compactor_concurrency"],
+                block_ranges=options["compactor_block_ranges"],
+                deletion_delay=options["compactor_deletion_delay"],
+                ring=ring,
+            ),
+            "distributor": distributor_config(instance_addr, distributor_limits, ring),
+            "ingester": ingester_config(
+                instance_addr, self._replication_factor, ingester_limits, ring, self._zone()
+            ),
+            "ruler": ruler_config(alertmanager_host),
             "ruler_storage": ruler_storage_config(),
-            "server": server_config(),
-            "store_gateway": store_gateway_config(),
+            "server": server_config(
+                grpc_max_message_size=options["grpc_max_message_size"],
+                grpc_max_concurrent_streams=options["grpc_max_concurrent_streams"],
+            ),
+            "store_gateway": store_gateway_config(instance_addr, self._replication_factor, ring),
             "alertmanager_storage": alertmanager_storage_config(),
-            "memberlist": memberlist_config(self.unit.name, self.peers),
+            "memberlist": self._memberlist_config(),
+            "querier": querier,
+            "query_scheduler": query_scheduler_config(
+                options["query_max_outstanding_requests_per_tenant"]
+            ),
+            "runtime_config": runtime_config(),
         }
 
+        if "querier" in self._components and "query-frontend" not in self._components:
+            if frontend_address := self.cluster.frontend_address:
+                config["frontend_worker"] = frontend_worker_config(frontend_address)
+
+        return yaml.dump(config)
+
+    def _runtime_config(self) -> str:
+        """Generate a Mimir runtime configuration.
+
+        Limits set through charm configuration options apply to the
+        default tenant, which receives all data since multi-tenancy
+        is disabled. They may be overridden per tenant through the
+        tenant_overrides option.
+
+        Raises:
+            ValueError: if a limit configuration option is invalid.
+        """
+        overrides = tenant_overrides(self.config["tenant_overrides"])
+        config = runtime_overrides_config(self._limits_config(), overrides)
+
         return yaml.dump(config)
 
+    def _limits_config(self):
+        """Generate the Mimir per tenant limits configuration.
+
+        Raises:
+            ValueError: if a limit configuration option is invalid.
+        """
+        options = self._tuned_config()
+        blocks_retention_period = options["blocks_retention_period"]
+        local_retention_period = self.config.get("tsdb_block_retention_period", "24h")
+        if 0 < parse_duration(blocks_retention_period) <= parse_duration(local_retention_period):
+            raise ValueError("blocks_retention_period must exceed tsdb_block_retention_period")
+
+        return limits_config(
+            ingestion_rate=options["ingestion_rate"],
+            ingestion_burst_size=options["ingestion_burst_size"],
+            max_global_series_per_user=options["max_global_series_per_user"],
+            max_global_series_per_metric=options["max_global_series_per_metric"],
+            max_label_names_per_series=options["max_label_names_per_series"],
+            max_fetched_series_per_query=options["max_fetched_series_per_query"],
+            max_fetched_chunks_per_query=options["max_fetched_chunks_per_query"],
+            max_total_query_length=options["max_total_query_length"],
+            query_sharding_total_shards=options["query_sharding_total_shards"],
+            results_cache_ttl=options["results_cache_ttl"],
+            query_ingesters_within=self._querier_lookback()[0],
+            compactor_split_and_merge_shards=options["compactor_split_and_merge_shards"],
+            compactor_split_groups=options["compactor_split_groups"],
+            compactor_blocks_retention_period=blocks_retention_period,
+        )
+
+    def _querier_lookback(self):
+        """Time ranges over which queriers read from ingesters and store gateways.
+
+        Returns:
+            A tuple of string durations (query_ingesters_within, query_store_after).
+
+        Raises:
+            ValueError: if a querier configuration option is invalid.
+        """
+        return querier_lookback(
+            self.config.get("tsdb_block_retention_period", "24h"),
+            query_ingesters_within=self.config["querier_query_ingesters_within"],
+            query_store_after=self.config["querier_query_store_after"],
+        )
+
+    def _caches(self):
+        """Generate configurations of caches served by the memcached sidecar.
+
+        Returns:
+            A mapping from cache names to cache configurations, which
+            is empty if the memcached sidecar is disabled.
+
+        Raises:
+            ValueError: if a cache configuration option is invalid.
+        """
+        if not self.config["memcached"]:
+            return {}
+
+        options = self._tuned_config()
+
+        # only the chunks and metadata caches of the bucket store have
+        # TTL settings, results are cached for a per tenant TTL limit
+        ttls = {
+            "chunks": {
+                "attributes_ttl": options["chunks_cache_ttl"],
+                "subrange_ttl": options["chunks_cache_ttl"],
+            },
+            "metadata": {"metafile_content_ttl": options["metadata_cache_ttl"]},
+        }
+
+        return {
+            name: cache_config(
+                f"localhost:{port}",
+                max_item_size=options[f"{name}_cache_max_item_size"],
+                ttls=ttls.get(name),
+            )
+            for name, port in MEMCACHED_PORTS.items()
+        }
+
+    def _memcached_servers(self):
+        """Generate command lines of memcached servers run by the sidecar.
+
+        Returns:
+            A mapping from cache names to memcached command lines, which
+            is empty if the memcached sidecar is disabled.
+
+        Raises:
+            ValueError: if a cache configuration option is invalid.
+        """
+        if not self.config["memcached"]:
+            return {}
+
+        options = self._tuned_config()
+        return {
+            name: memcached_command(
+                port,
+                options[f"{name}_cache_size"],
+                options[f"{name}_cache_max_item_size"],
+            )
+            for name, port in MEMCACHED_PORTS.items()
+        }
+
+    def _tuned_config(self):
+        """Charm configuration with the values of the sizing profile applied.
+
+        Options left at their default values take the values set by
+        the sizing profile, if any, so that options set explicitly
+        override the profile.
+
+        Returns:
+            A mapping from charm configuration option names to values.
+
+        Raises:
+            ValueError: if the sizing profile is invalid.
+        """
+        # the tuned options are needed many times while rendering the
+        # configuration, so they are only rebuilt if the config changed
+        key = tuple(sorted(self.config.items()))
+        if self._tuned_options and self._tuned_options[0] == key:
+            return self._tuned_options[1]
+
+        cpus, memory = self._resource_limits
+        profile = profile_options(self.config["profile"], cpus=cpus, memory=memory)
+        defaults = self._config_defaults
+
+        options = {
+            name: profile[name] if name in profile and value == defaults.get(name) else value
+            for name, value in self.config.items()
+        }
+        self._tuned_options = (key, options)
+
+        return options
+
+    @property
+    def _resource_limits(self):
+        """CPU and memory limits of the Mimir container.
+
+        The limits are read from the workload container once, since
+        changing them recreates the pod, and so the charm, as well.
+
+        Returns:
+            A tuple of the number of CPUs and the memory in bytes the
+            Mimir container is limited to, each None if unlimited or
+            if the workload container is not reachable yet.
+        """
+        if self._container_limits is None:
+            container = self.unit.get_container(self._name)
+            if not container.can_connect():
+                return None, None
+            self._container_limits = (cpu_limit(container), memory_limit(container))
+
+        return self._container_limits
+
+    @property
+    def _config_defaults(self):
+        """Default values of charm configuration options."""
+        return _config_defaults(str(self.charm_dir / "config.yaml"))
+
+    def _memberlist_config(self):
+        """Generate the Mimir memberlist configuration of this unit.
+
+        Members of the memberlist include peer units as well as
+        units of other Mimir applications of the same cluster.
+
+        Raises:
+            ValueError: if the memberlist discovery mode is invalid.
+        """
+        discovery = self.config["memberlist_discovery"]
+        if discovery not in MEMBERLIST_DISCOVERY_MODES:
+            raise ValueError(
+                f"Invalid memberlist discovery {discovery!r}, expected one of "
+                f"{', '.join(MEMBERLIST_DISCOVERY_MODES)}"
+            )
+
+        if discovery == "dns":
+            discovery_addresses = [
+                self.memberlist_service.address,
+                *self.cluster.memberlist_addresses,
+            ]
+            return memberlist_config(self.unit.name, self.peers, discovery_addresses)
+
+        members = {**self.peers, **self.cluster.members}
+        return memberlist_config(self.unit.name, members)
+
     def _set_alertmanager_config(self):
         """Set the Mimir Alertmanager configuration.
 
@@ -329,6 +1147,9 @@ class MimirCharm(CharmBase):
             self.unit.status = WaitingStatus("Waiting for Pebble ready")
             return False
 
+        if "alertmanager" not in self._components:
+            return False
+
         cfg = self.config["alertmanager_template"] or DEFAULT_ALERT_TEMPLATE
         tpl = self.config["alertmanager_config"] or yaml.dump(DEFAULT_ALERTMANAGER_CONFIG)
         aconfig = {
@@ -383,6 +1204,63 @@ class MimirCharm(CharmBase):
 
         return url
 
+    @property
+    def _unit_number(self):
+        """Ordinal number of this unit."""
+        return int(self.unit.name.split("/")[-1])
+
+    @property
+    def _replication_factor(self):
+        """Replication factor of Mimir rings.
+
+        Returns:
+            The replication factor shared by the leader if available,
+            otherwise one computed from the number of planned units.
+        """
+        if self.peer_relation:
+            if factor := self.peer_relation.data[self.app].get("replication_factor"):
+                return int(factor)
+
+        return replication_factor(self.app.planned_units(), self.config["replication_factor"])
+
+    @property
+    def _components(self):
+        """Mimir components run by this unit.
+
+        Returns:
+            A set of names of Mimir components, which is empty if
+            the target configuration option is invalid.
+        """
+        try:
+            return target_components(self.config["target"])
+        except ValueError:
+            return set()
+
+    @property
+    def _serves_alert_rules(self):
+        """Check if alert rules of remote write consumers are loaded by this unit.
+
+        Returns:
+            True if this unit accepts remote writes and runs a ruler.
+        """
+        return bool(self.remote_write_provider) and "ruler" in self._components
+
+    @property
+    def _frontend_peers(self):
+        """Peers used to configure the Mimir query frontend.
+
+        With DNS based memberlist discovery the Mimir configuration
+        must not depend on the current set of peers, so that peer
+        changes never require a restart.
+
+        Returns:
+            A mapping from peer unit names to peer hostnames.
+        """
+        if self.config["memberlist_discovery"] == "dns":
+            return {self.unit.name: str(self.hostname)}
+
+        return self.peers
+
     @property
     def peer_relation(self):
         """Fetch the peer relation.
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""A interface to the Mimir server HTTP API."""
+
+import logging
+import re
+import urllib
+from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin
+from urllib.request import Request
+
+from .config import (
+    MIMIR_INGESTER_SHUTDOWN_PATH,
+    MIMIR_METRICS_PATH,
+    MIMIR_PORT,
+    MIMIR_READY_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+BUCKET_INDEX_UPDATE_METRIC = re.compile(
+    r'^cortex_bucket_index_last_successful_update_timestamp_seconds\{[^}]*user="([^"]*)"[^}]*\}'
+    r"\s+(\S+)",
+    re.MULTILINE,
+)
+
+
+class MimirAPI:
+    """A Mimir server."""
+
+    def __init__(self, host="localhost", timeout=5):
+        """Construct a Mimir API object.
+
+        Args:
+            host: string hostname or address of the Mimir server which
+                this object must interface with.
+            timeout: default timeout in seconds for API requests.
+        """
+        self._host = host
+        self._timeout = timeout
+        self._base_url = f"http://{self._host}:{MIMIR_PORT}"
+
+    def is_ready(self) -> bool:
+        """Check if Mimir is ready to serve requests.
+
+        Mimir reports itself as ready only after all its modules
+        have started, which for an ingester includes replaying
+        its write ahead log.
+
+        Returns:
+            True if Mimir is ready, False otherwise.
+        """
+        url = urljoin(self._base_url, MIMIR_READY_PATH)
+        request = Request(url, method="GET")
+
+        try:
+            response = urllib.request.urlopen(request, timeout=self._timeout)
+        except HTTPError as error:
+            logger.debug("Mimir is not ready, status: %s, reason: %s", error.status, error.reason)
+            return False
+        except URLError as error:
+            logger.debug("Mimir is not reachable at %s : %s", url, error)
+            return False
+        except TimeoutError:
+            logger.debug("Request timeout checking readiness at %s", url)
+            return False
+
+        return response.status == 200
+
+    def shutdown_ingester(self, timeout=None) -> bool:
+        """Shut down the Mimir ingester.
+
+        The ingester flushes its in-memory series, ships the
+        resulting blocks to the blocks storage and leaves the
+        ingester ring.
+
+        Args:
+            timeout: maximum time in seconds to wait for the shutdown
+                to complete.
+
+        Returns:
+            True if the ingester was shut down, False otherwise.
+        """
+        return self._post(MIMIR_INGESTER_SHUTDOWN_PATH, timeout)
+
+    def bucket_index_updated_at(self):
+        """Times at which the compactor last updated bucket indexes.
+
+        Returns:
+            A mapping from tenant IDs to UNIX timestamps of the last
+            successful bucket index update of the tenant, or None if
+            Mimir metrics are unavailable. Only Mimir servers running
+            a compactor report these timestamps.
+        """
+        metrics = self._get(MIMIR_METRICS_PATH)
+        if metrics is None:
+            return None
+
+        return {
+            tenant: float(timestamp)
+            for tenant, timestamp in BUCKET_INDEX_UPDATE_METRIC.findall(metrics)
+        }
+
+    def _get(self, path):
+        """Make a HTTP GET request to Mimir.
+
+        Returns:
+            The string response body or None if the request failed.
+        """
+        url = urljoin(self._base_url, path)
+        request = Request(url, method="GET")
+
+        try:
+            response = urllib.request.urlopen(request, timeout=self._timeout)
+        except HTTPError as error:
+            logger.debug(
+                "Failed getting %s, status: %s, reason: %s", url, error.status, error.reason
+            )
+            return None
+        except URLError as error:
+            logger.debug("Mimir is not reachable at %s : %s", url, error)
+            return None
+        except TimeoutError:
+            logger.debug("Request timeout getting URL %s", url)
+            return None
+
+        return response.read().decode("utf-8")
+
+    def _post(self, path, timeout=None) -> bool:
+        """Make a HTTP POST request to Mimir.
+
+        Returns:
+            True if Mimir responded with a success status, False otherwise.
+        """
+        url = urljoin(self._base_url, path)
+        timeout = timeout if timeout else self._timeout
+        request = Request(url, data=b"", method="POST")
+
+        try:
+            response = urllib.request.urlopen(request, timeout=timeout)
+        except HTTPError as error:
+            logger.debug(
+                "Failed posting to %s, status: %s, reason: %s", url, error.status, error.reason
+            )
+            return False
+        except URLError as error:
+            logger.debug("Invalid URL %s : %s", url, error)
+            return False
+        except TimeoutError:
+            logger.debug("Request timeout during posting to URL %s", url)
+            return False
+
+        return 200 <= response.status < 300
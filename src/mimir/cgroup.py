@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Resource limits of the Mimir workload container.
+
+Limits are read from the control group files of the workload
+container through Pebble, since the charm container has limits
+of its own. Both cgroup v2 and v1 hierarchies are supported.
+"""
+
+import logging
+
+from ops.pebble import Error as PebbleError
+
+logger = logging.getLogger(__name__)
+
+CGROUP_V2_MEMORY_MAX = "/sys/fs/cgroup/memory.max"
+CGROUP_V1_MEMORY_LIMIT = "/sys/fs/cgroup/memory/memory.limit_in_bytes"
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_CPU_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_CPU_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+# cgroup v1 reports an unlimited memory limit as a very large number
+CGROUP_V1_UNLIMITED = 2**60
+
+
+def _read(container, path):
+    """Read a control group file of a container.
+
+    Returns:
+        The stripped file content, or None if the file can not be read.
+    """
+    try:
+        if not container.exists(path):
+            return None
+        return container.pull(path).read().strip()
+    except (PebbleError, OSError) as e:
+        logger.debug("Failed to read %s : %s", path, e)
+        return None
+
+
+def memory_limit(container):
+    """Memory limit of a container.
+
+    Args:
+        container: an :class:`ops.model.Container`.
+
+    Returns:
+        The memory limit in bytes, or None if the container has no
+        memory limit or the limit can not be determined.
+    """
+    if not container.can_connect():
+        return None
+
+    if (value := _read(container, CGROUP_V2_MEMORY_MAX)) is not None:
+        return int(value) if value.isdigit() else None
+
+    if (value := _read(container, CGROUP_V1_MEMORY_LIMIT)) is not None:
+        if value.isdigit() and int(value) < CGROUP_V1_UNLIMITED:
+            return int(value)
+
+    return None
+
+
+def cpu_limit(container):
+    """CPU limit of a container.
+
+    Args:
+        container: an :class:`ops.model.Container`.
+
+    Returns:
+        The CPU limit as a possibly fractional number of CPUs, or None
+        if the container has no CPU limit or the limit can not be
+        determined.
+    """
+    if not container.can_connect():
+        return None
+
+    if (value := _read(container, CGROUP_V2_CPU_MAX)) is not None:
+        quota, _, period = value.partition(" ")
+    else:
+        quota = _read(container, CGROUP_V1_CPU_QUOTA)
+        period = _read(container, CGROUP_V1_CPU_PERIOD)
+
+    # an unlimited quota is "max" in cgroup v2 and -1 in cgroup v1
+    if not quota or not period or not quota.isdigit() or not period.isdigit():
+        return None
+
+    return int(quota) / int(period) if int(period) else None
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Discovery of Mimir applications deployed with different targets.
+
+Mimir applications deployed with different targets, for instance
+one for the read path and another for the write path, form a single
+Mimir cluster by relating the "mimir-cluster-join" endpoint of one
+application to the "mimir-cluster" endpoint of another. Every unit
+shares its hostname and the Mimir components it runs in its unit
+data bag, and the leader of each application shares the addresses
+of its Kubernetes services in the application data bag.
+"""
+
+import json
+import logging
+
+from ops.framework import EventBase, EventSource, Object, ObjectEvents
+
+from .config import MIMIR_GRPC_PORT
+
+logger = logging.getLogger(__name__)
+
+
+class MimirClusterChanged(EventBase):
+    """Event emitted when members of the Mimir cluster change."""
+
+
+class MimirClusterEvents(ObjectEvents):
+    """Events emitted by a Mimir cluster."""
+
+    cluster_changed = EventSource(MimirClusterChanged)
+
+
+class MimirCluster(Object):
+    """Membership of this application in a Mimir cluster."""
+
+    on = MimirClusterEvents()
+
+    def __init__(
+        self,
+        charm,
+        relation_names,
+        hostname,
+        components,
+        service_address,
+        memberlist_address,
+    ):
+        """Construct a Mimir cluster membership.
+
+        Args:
+            charm: the Mimir charm.
+            relation_names: a list of string names of relations over
+                which Mimir cluster members are discovered.
+            hostname: string hostname of this unit.
+            components: a set of names of Mimir components run by
+                this application.
+            service_address: string DNS name of the Kubernetes service
+                of this application.
+            memberlist_address: string DNS name of the headless
+                Kubernetes service of this application.
+        """
+        super().__init__(charm, "mimir-cluster")
+        self._charm = charm
+        self._relation_names = relation_names
+        self._hostname = hostname
+        self._components = components
+        self._service_address = service_address
+        self._memberlist_address = memberlist_address
+
+        for relation_name in relation_names:
+            events = charm.on[relation_name]
+            self.framework.observe(events.relation_joined, self._on_member_joined)
+            self.framework.observe(events.relation_changed, self._on_member_changed)
+            self.framework.observe(events.relation_departed, self._on_member_changed)
+            self.framework.observe(events.relation_broken, self._on_member_changed)
+        self.framework.observe(charm.on.leader_elected, self._on_member_joined)
+        self.framework.observe(charm.on.config_changed, self._on_member_joined)
+
+    def _on_member_joined(self, _):
+        """Share this unit's and application's cluster data."""
+        for relation in self._relations:
+            relation.data[self.model.unit].update(
+                {"hostname": self._hostname, "components": json.dumps(sorted(self._components))}
+            )
+
+            if self.model.unit.is_leader():
+                relation.data[self.model.app].update(
+                    {
+                        "components": json.dumps(sorted(self._components)),
+                        "service_address": self._service_address,
+                        "memberlist_address": self._memberlist_address,
+                    }
+                )
+
+    def _on_member_changed(self, _):
+        """Notify the charm that cluster members have changed."""
+        self.on.cluster_changed.emit()
+
+    @property
+    def members(self):
+        """Fetch all remote cluster member names and hostnames.
+
+        Returns:
+            A mapping from remote unit names to hostnames.
+        """
+        members = {}
+        for relation in self._relations:
+            for unit in relation.units:
+                if hostname := relation.data[unit].get("hostname"):
+                    members[unit.name] = hostname
+
+        return members
+
+    @property
+    def memberlist_addresses(self):
+        """DNS names of the headless services of remote applications.
+
+        Returns:
+            A list of string DNS names.
+        """
+        addresses = set()
+        for relation in self._relations:
+            if relation.app and (address := relation.data[relation.app].get("memberlist_address")):
+                addresses.add(address)
+
+        return sorted(addresses)
+
+    def service_address(self, component):
+        """DNS name of the service of a remote application running a component.
+
+        Args:
+            component: string name of a Mimir component.
+
+        Returns:
+            A string DNS name or None if no remote application runs
+            the component.
+        """
+        for relation in self._relations:
+            if not relation.app:
+                continue
+            data = relation.data[relation.app]
+            if component in json.loads(data.get("components", "[]")):
+                return data.get("service_address")
+
+        return None
+
+    @property
+    def frontend_address(self):
+        """The gRPC address of a remote query frontend.
+
+        Returns:
+            A string address or None if no remote application runs
+            a query frontend.
+        """
+        if address := self.service_address("query-frontend"):
+            return f"{address}:{MIMIR_GRPC_PORT}"
+
+        return None
+
+    @property
+    def _relations(self):
+        """All relations with other Mimir applications."""
+        return [
+            relation
+            for relation_name in self._relation_names
+            for relation in self.model.relations[relation_name]
+        ]
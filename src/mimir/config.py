@@ -4,26 +4,377 @@
 
 """Utilities to construct Mimir configuration."""
 
+import math
+import re
+
+import yaml
+
 MIMIR_PORT = 9009
+MIMIR_GRPC_PORT = 9095
+MIMIR_MEMBERLIST_PORT = 7946
+MEMBERLIST_DISCOVERY_MODES = ("static", "dns")
 MIMIR_PUSH_PATH = "/api/v1/push"
+MIMIR_READY_PATH = "/ready"
+MIMIR_INGESTER_SHUTDOWN_PATH = "/ingester/shutdown"
+MIMIR_METRICS_PATH = "/metrics"
 MIMIR_CONFIG_FILE = "/etc/mimir/config.yaml"
+MIMIR_RUNTIME_CONFIG_FILE = "/etc/mimir/runtime.yaml"
+MIMIR_DEFAULT_TENANT = "anonymous"
+
+# the write ahead log, TSDB blocks and other state that must survive
+# restarts are kept on the durable "database" storage, whereas scratch
+# data that is rebuilt from the blocks storage, and whose I/O would
+# otherwise compete with the write ahead log, is kept on the "scratch"
+# storage, which may be ephemeral
+MIMIR_SCRATCH_DIR = "/tmp/mimir-scratch"
 
 MIMIR_DIRS = {
-    "bucket_store": "/tmp/mimir/tsdb-sync",
+    "bucket_store": f"{MIMIR_SCRATCH_DIR}/tsdb-sync",
     "data": "/tmp/mimir/data/tsdb",
     "tsdb": "/tmp/mimir/tsdb",
-    "compactor": "/tmp/mimir/compactor",
+    "compactor": f"{MIMIR_SCRATCH_DIR}/compactor",
     "rules": "/tmp/mimir/rules",
     "data-alertmanager": "/tmp/mimir/data-alertmanager",
     "tenant-rules": "/tmp/mimir/rules/anonymous",
+    "tokens": "/tmp/mimir/tokens",
+}
+
+MEMCACHED_PORTS = {
+    "results": 11211,
+    "index": 11212,
+    "chunks": 11213,
+    "metadata": 11214,
 }
 
+DEFAULT_REPLICATION_FACTOR = 3
+
+# share of the memory limit of the Mimir container used as the soft
+# memory limit of the Go runtime, leaving headroom for non-heap memory
+GO_MEMORY_LIMIT_SHARE = 0.9
+GO_MEMORY_LIMIT_PATTERN = re.compile(r"^\d+(B|KiB|MiB|GiB|TiB)?$")
+
+# approximate memory used by an in-memory series of an ingester
+# and by an in-flight push request, used to derive instance limits
+# from the memory limit of the Mimir container
+SERIES_MEMORY_BYTES = 8 * 1024
+PUSH_REQUEST_MEMORY_BYTES = 128 * 1024
+SERIES_MEMORY_SHARE = 0.8
+PUSH_REQUEST_MEMORY_SHARE = 0.25
+
+MIMIR_COMPONENTS = (
+    "alertmanager",
+    "compactor",
+    "distributor",
+    "ingester",
+    "overrides-exporter",
+    "querier",
+    "query-frontend",
+    "query-scheduler",
+    "ruler",
+    "store-gateway",
+)
+
+MIMIR_TARGET_GROUPS = {
+    "all": (
+        "compactor",
+        "distributor",
+        "ingester",
+        "querier",
+        "query-frontend",
+        "ruler",
+        "store-gateway",
+    ),
+    "read": ("querier", "query-frontend"),
+    "write": ("distributor", "ingester"),
+    "backend": (
+        "alertmanager",
+        "compactor",
+        "overrides-exporter",
+        "query-scheduler",
+        "ruler",
+        "store-gateway",
+    ),
+}
+
+
+def target_components(target):
+    """Mimir components run for a Mimir target.
+
+    Args:
+        target: a string comma separated list of Mimir components
+            or groups of components such as "all", "read", "write"
+            and "backend".
+
+    Returns:
+        A set of names of Mimir components.
+
+    Raises:
+        ValueError: if the target is empty or contains an unknown
+            component or group.
+    """
+    components = set()
+    for name in (name.strip() for name in target.split(",")):
+        if name in MIMIR_TARGET_GROUPS:
+            components.update(MIMIR_TARGET_GROUPS[name])
+        elif name in MIMIR_COMPONENTS:
+            components.add(name)
+        else:
+            raise ValueError(f"Invalid Mimir target: {name or target!r}")
+
+    return components
+
+
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800, "y": 31536000}
+DURATION_PATTERN = re.compile(r"(\d+)(ms|s|m|h|d|w|y)")
+
+
+def parse_duration(value):
+    """Parse a Mimir duration.
+
+    Args:
+        value: a string duration such as "90s" or "1h30m".
+
+    Returns:
+        The duration in seconds.
+
+    Raises:
+        ValueError: if the value is not a valid duration.
+    """
+    value = str(value).strip()
+    if value == "0":
+        return 0
+
+    if not value or DURATION_PATTERN.sub("", value):
+        raise ValueError(f"Invalid duration: {value!r}")
+
+    return sum(
+        int(amount) * DURATION_UNITS[unit] for amount, unit in DURATION_PATTERN.findall(value)
+    )
+
+
+def format_duration(seconds):
+    """Format a duration as a Mimir duration.
+
+    Args:
+        seconds: an integer duration in seconds.
+
+    Returns:
+        A string duration in the largest of hours, minutes or seconds
+        that represents the duration exactly.
+    """
+    for unit in ("h", "m"):
+        if seconds and seconds % DURATION_UNITS[unit] == 0:
+            return f"{seconds // DURATION_UNITS[unit]}{unit}"
+
+    return f"{seconds}s"
+
+
+def replication_factor(num_units, requested=0):
+    """Replication factor of Mimir rings.
+
+    Args:
+        num_units: number of Mimir units in the ring.
+        requested: requested replication factor, or 0 to use the
+            default replication factor.
+
+    Returns:
+        An odd integer replication factor which never exceeds the
+        number of units, since writes would otherwise fail to reach a
+        quorum. Even factors are rounded down, since their quorum is
+        no smaller than that of the next odd factor, so that writes
+        would fail whenever a single unit restarts with 2 replicas.
+    """
+    factor = requested if requested > 0 else DEFAULT_REPLICATION_FACTOR
+    factor = min(factor, num_units)
+    if factor % 2 == 0:
+        factor -= 1
+
+    return max(1, factor)
+
+
+def tsdb_config(
+    memory_snapshot_on_shutdown=True,
+    wal_replay_concurrency=0,
+    wal_segment_size=134217728,
+    wal_compression=True,
+    head_compaction_interval="1m",
+    ship_interval="1m",
+):
+    """Mimir ingester TSDB tuning configuration.
+
+    These settings govern how quickly an ingester recovers its
+    in-memory series after a restart.
+
+    Args:
+        memory_snapshot_on_shutdown: if True the in-memory head is
+            snapshotted on shutdown so that only WAL records written
+            after the snapshot are replayed on start.
+        wal_replay_concurrency: number of concurrent WAL replay
+            workers, or 0 to use one per available CPU.
+        wal_segment_size: size of WAL segment files in bytes.
+        wal_compression: if True WAL records are compressed, which
+            reduces disk I/O during writes and replay.
+        head_compaction_interval: string duration between checks for
+            head blocks ready to be compacted.
+        ship_interval: string duration between uploads of compacted
+            blocks to the blocks storage.
+
+    Raises:
+        ValueError: if any of the settings is invalid.
+    """
+    if wal_replay_concurrency < 0:
+        raise ValueError("WAL replay concurrency must not be negative")
+
+    # Mimir WAL segments are between 128KiB and 4GiB
+    if not 128 * 1024 <= wal_segment_size <= 4 * 1024**3:
+        raise ValueError("WAL segment size must be between 128KiB and 4GiB")
+
+    # Mimir only supports head compaction intervals up to 15 minutes
+    if not 0 < parse_duration(head_compaction_interval) <= 15 * 60:
+        raise ValueError("Head compaction interval must be between 0 and 15m")
+
+    if parse_duration(ship_interval) <= 0:
+        raise ValueError("Ship interval must be greater than 0")
 
-def block_storage_config(s3_config, retention_period):
-    """Mimir Blocks Storage configuration."""
     cfg = {
-        "bucket_store": {"sync_dir": MIMIR_DIRS["bucket_store"]},
-        "tsdb": {"dir": MIMIR_DIRS["tsdb"], "retention_period": retention_period},
+        "memory_snapshot_on_shutdown": memory_snapshot_on_shutdown,
+        "wal_replay_concurrency": wal_replay_concurrency,
+        "wal_segment_size_bytes": wal_segment_size,
+        "wal_compression_enabled": wal_compression,
+        "head_compaction_interval": head_compaction_interval,
+        "ship_interval": ship_interval,
+    }
+
+    return cfg
+
+
+def bucket_index_config(update_interval="15m", idle_timeout="1h", max_stale_period="1h"):
+    """Mimir Bucket Index configuration.
+
+    The bucket index lists all blocks of a tenant in a single object,
+    which queriers and store gateways read instead of listing the
+    bucket. Compactors update the bucket index of every tenant once
+    per cleanup interval.
+
+    Args:
+        update_interval: string duration between bucket index updates
+            by compactors.
+        idle_timeout: string duration after which a querier unloads
+            the bucket index of a tenant it has not queried.
+        max_stale_period: string duration after which queries of a
+            tenant fail if its bucket index has not been updated.
+
+    Raises:
+        ValueError: if any of the durations is invalid or the bucket
+            index may become stale between two updates.
+    """
+    update = parse_duration(update_interval)
+    if update <= 0:
+        raise ValueError("Bucket index update interval must be greater than 0")
+
+    if parse_duration(idle_timeout) <= 0:
+        raise ValueError("Bucket index idle timeout must be greater than 0")
+
+    if parse_duration(max_stale_period) <= update:
+        raise ValueError("Bucket index max stale period must exceed its update interval")
+
+    cfg = {"idle_timeout": idle_timeout, "max_stale_period": max_stale_period}
+
+    return cfg
+
+
+def bucket_store_config(
+    sync_interval="15m",
+    block_sync_concurrency=20,
+    lazy_loading=True,
+    lazy_loading_idle_timeout="1h",
+    max_concurrent=100,
+    max_chunk_pool_bytes=0,
+    bucket_index=None,
+):
+    """Mimir Bucket Store configuration of store gateways.
+
+    Args:
+        sync_interval: string duration between scans of the bucket
+            for new and deleted blocks.
+        block_sync_concurrency: number of blocks synced at the same
+            time, which mostly affects the duration of the initial sync.
+        lazy_loading: if True block index headers are loaded on first
+            use instead of when blocks are synced.
+        lazy_loading_idle_timeout: string duration after which an
+            unused index header is unloaded. A duration of 0 never
+            unloads index headers.
+        max_concurrent: maximum number of queries fetching series
+            from the bucket at the same time.
+        max_chunk_pool_bytes: size in bytes of the pool of chunk
+            buffers, or 0 to use the Mimir default.
+        bucket_index: an optional dictionary of bucket index settings,
+            as built by :func:`bucket_index_config`.
+
+    Raises:
+        ValueError: if any of the options is invalid.
+    """
+    if parse_duration(sync_interval) <= 0:
+        raise ValueError("Bucket store sync interval must be greater than 0")
+
+    parse_duration(lazy_loading_idle_timeout)
+
+    counts = {
+        "block_sync_concurrency": block_sync_concurrency,
+        "max_concurrent": max_concurrent,
+    }
+    for name, count in counts.items():
+        if count <= 0:
+            raise ValueError(f"{name} must be greater than 0")
+
+    if max_chunk_pool_bytes < 0:
+        raise ValueError("Chunk pool size must not be negative")
+
+    cfg = {
+        "sync_interval": sync_interval,
+        **counts,
+        "index_header": {
+            "lazy_loading_enabled": lazy_loading,
+            "lazy_loading_idle_timeout": lazy_loading_idle_timeout,
+        },
+    }
+
+    if max_chunk_pool_bytes:
+        cfg["max_chunk_pool_bytes"] = max_chunk_pool_bytes
+
+    if bucket_index:
+        cfg["bucket_index"] = bucket_index
+
+    return cfg
+
+
+def block_storage_config(s3_config, retention_period, tsdb=None, caches=None, bucket_store=None):
+    """Mimir Blocks Storage configuration.
+
+    Args:
+        s3_config: a dictionary of S3 settings, or None to store
+            blocks on the local filesystem.
+        retention_period: string duration for which blocks are
+            retained locally by ingesters.
+        tsdb: an optional dictionary of additional ingester TSDB
+            settings, as built by :func:`tsdb_config`.
+        caches: an optional mapping from bucket store cache names,
+            such as "index_cache", to cache configurations as built
+            by :func:`cache_config`.
+        bucket_store: an optional dictionary of additional bucket
+            store settings, as built by :func:`bucket_store_config`.
+    """
+    cfg = {
+        "bucket_store": {
+            "sync_dir": MIMIR_DIRS["bucket_store"],
+            **(bucket_store or {}),
+            **(caches or {}),
+        },
+        "tsdb": {
+            "dir": MIMIR_DIRS["tsdb"],
+            "retention_period": retention_period,
+            **(tsdb or {}),
+        },
     }
 
     if s3_config:
@@ -36,48 +387,659 @@ def block_storage_config(s3_config, retention_period):
     return cfg
 
 
-def frontend_config(peers):
-    """Mimir frontend configuration."""
-    cfg = {"instance_interface_names": list(peers.values())}
+def limits_config(
+    ingestion_rate=10000,
+    ingestion_burst_size=200000,
+    max_global_series_per_user=150000,
+    max_global_series_per_metric=0,
+    max_label_names_per_series=30,
+    max_fetched_series_per_query=0,
+    max_fetched_chunks_per_query=2000000,
+    max_total_query_length="0s",
+    query_sharding_total_shards=16,
+    results_cache_ttl="7d",
+    query_ingesters_within="13h",
+    compactor_split_and_merge_shards=0,
+    compactor_split_groups=1,
+    compactor_blocks_retention_period="0s",
+):
+    """Mimir per tenant limits configuration.
+
+    Limits of 0 disable the corresponding limit.
+
+    Args:
+        ingestion_rate: samples per second a tenant may ingest.
+        ingestion_burst_size: samples a tenant may ingest in a burst
+            above its ingestion rate.
+        max_global_series_per_user: in-memory series per tenant across
+            all ingesters.
+        max_global_series_per_metric: in-memory series per metric name
+            across all ingesters.
+        max_label_names_per_series: label names per series.
+        max_fetched_series_per_query: unique series fetched by a query.
+        max_fetched_chunks_per_query: chunks fetched by a query.
+        max_total_query_length: string duration of the longest time
+            range a query may span.
+        query_sharding_total_shards: number of shards a shardable
+            query is split into by query frontends.
+        results_cache_ttl: string duration for which query results
+            are cached.
+        query_ingesters_within: string duration of the time range
+            queried from ingesters.
+        compactor_split_and_merge_shards: number of shards the blocks
+            of a tenant are split into by compactors, so that shards
+            are compacted in parallel.
+        compactor_split_groups: number of groups the blocks of a tenant
+            are split into, each split into shards in parallel.
+        compactor_blocks_retention_period: string duration after which
+            blocks are deleted from the blocks storage by compactors.
+
+    Raises:
+        ValueError: if any of the limits is invalid.
+    """
+    if ingestion_rate <= 0:
+        raise ValueError("Ingestion rate must be greater than 0")
+
+    if ingestion_burst_size < ingestion_rate:
+        raise ValueError("Ingestion burst size must not be less than the ingestion rate")
+
+    counts = {
+        "max_global_series_per_user": max_global_series_per_user,
+        "max_global_series_per_metric": max_global_series_per_metric,
+        "max_label_names_per_series": max_label_names_per_series,
+        "max_fetched_series_per_query": max_fetched_series_per_query,
+        "max_fetched_chunks_per_query": max_fetched_chunks_per_query,
+        "query_sharding_total_shards": query_sharding_total_shards,
+        "compactor_split_and_merge_shards": compactor_split_and_merge_shards,
+    }
+    for name, count in counts.items():
+        if count < 0:
+            raise ValueError(f"{name} must not be negative")
+
+    parse_duration(max_total_query_length)
+
+    if parse_duration(results_cache_ttl) <= 0:
+        raise ValueError("Results cache TTL must be greater than 0")
+
+    parse_duration(query_ingesters_within)
+
+    if compactor_split_groups <= 0:
+        raise ValueError("Compactor split groups must be greater than 0")
+
+    parse_duration(compactor_blocks_retention_period)
+
+    cfg = {
+        "ingestion_rate": ingestion_rate,
+        "ingestion_burst_size": ingestion_burst_size,
+        **counts,
+        "max_total_query_length": max_total_query_length,
+        "results_cache_ttl": results_cache_ttl,
+        "query_ingesters_within": query_ingesters_within,
+        "compactor_split_groups": compactor_split_groups,
+        "compactor_blocks_retention_period": compactor_blocks_retention_period,
+    }
+
+    return cfg
+
+
+def tenant_overrides(overrides):
+    """Parse per tenant limit overrides.
+
+    Args:
+        overrides: a string YAML mapping from tenant IDs to mappings
+            of limit names to values.
+
+    Returns:
+        A dictionary of per tenant limit overrides.
+
+    Raises:
+        ValueError: if the overrides are not a valid YAML mapping of
+            tenant IDs to limits.
+    """
+    try:
+        parsed = yaml.safe_load(overrides or "{}") or {}
+    except yaml.YAMLError as e:
+        raise ValueError(f"Invalid tenant overrides: {e}")
+
+    if not isinstance(parsed, dict) or not all(
+        isinstance(limits, dict) for limits in parsed.values()
+    ):
+        raise ValueError("Tenant overrides must map tenant IDs to limits")
+
+    return {str(tenant): limits for tenant, limits in parsed.items()}
+
+
+def runtime_overrides_config(limits, overrides=None):
+    """Mimir runtime configuration.
+
+    Mimir periodically reloads this configuration, so changes to
+    it take effect without restarting Mimir.
+
+    Args:
+        limits: a dictionary of limits of the default tenant, as
+            built by :func:`limits_config`.
+        overrides: an optional dictionary of per tenant limit
+            overrides, which take precedence over the limits of
+            the default tenant.
+    """
+    overrides = overrides or {}
+    tenants = {MIMIR_DEFAULT_TENANT: dict(limits)}
+    for tenant, tenant_limits in overrides.items():
+        tenants.setdefault(tenant, {}).update(tenant_limits)
+
+    cfg = {"overrides": tenants}
+
+    return cfg
+
+
+def runtime_config():
+    """Mimir runtime configuration reload settings."""
+    cfg = {"file": MIMIR_RUNTIME_CONFIG_FILE, "period": "10s"}
 
     return cfg
 
 
-def compactor_config():
-    """Mimir Compactor configuration."""
+def go_runtime_environment(cpus=None, memory=None, gomaxprocs=0, gomemlimit="", gogc=100):
+    """Environment variables tuning the Go runtime of Mimir.
+
+    Unless set explicitly, GOMAXPROCS is the CPU limit of the Mimir
+    container rounded up, rather than the number of CPUs of the node,
+    and GOMEMLIMIT is a share of its memory limit, so that the garbage
+    collector runs more often before the container runs out of memory.
+
+    Args:
+        cpus: number of CPUs the Mimir container is limited to, or None.
+        memory: memory in bytes the Mimir container is limited to, or None.
+        gomaxprocs: maximum number of CPUs used by Mimir, or 0 to derive
+            it from the CPU limit.
+        gomemlimit: string soft memory limit of Mimir such as "3GiB",
+            or an empty string to derive it from the memory limit.
+        gogc: garbage collection target percentage, or -1 to disable
+            garbage collection except when reaching the memory limit.
+
+    Returns:
+        A mapping from environment variable names to string values.
+
+    Raises:
+        ValueError: if any of the options is invalid.
+    """
+    if gomaxprocs < 0:
+        raise ValueError("GOMAXPROCS must not be negative")
+
+    if gomemlimit and not GO_MEMORY_LIMIT_PATTERN.match(gomemlimit):
+        raise ValueError(f"Invalid GOMEMLIMIT {gomemlimit!r}, expected for example 3GiB")
+
+    if gogc < -1:
+        raise ValueError("GOGC must be -1 or greater")
+
+    env = {"GOGC": "off" if gogc == -1 else str(gogc)}
+
+    if gomaxprocs or cpus:
+        env["GOMAXPROCS"] = str(gomaxprocs or max(1, math.ceil(cpus)))
+
+    if gomemlimit or memory:
+        env["GOMEMLIMIT"] = gomemlimit or str(int(memory * GO_MEMORY_LIMIT_SHARE))
+
+    return env
+
+
+def frontend_worker_config(frontend_address):
+    """Mimir Querier frontend worker configuration.
+
+    Args:
+        frontend_address: a string gRPC address of a query frontend
+            run by another Mimir application.
+    """
+    cfg = {"frontend_address": frontend_address}
+
+    return cfg
+
+
+def cache_config(addresses, max_item_size=1048576, ttls=None):
+    """Mimir memcached cache configuration.
+
+    Args:
+        addresses: a string comma separated list of memcached server
+            addresses, each of the form "host:port". Addresses may be
+            prefixed by "dns+" to resolve all servers behind a DNS name.
+        max_item_size: maximum size in bytes of an item stored in the
+            cache, which must not exceed the memcached item size limit.
+        ttls: an optional mapping from names of Mimir cache TTL
+            settings to string durations.
+
+    Raises:
+        ValueError: if the addresses or the item size are invalid.
+    """
+    servers = [address.strip() for address in addresses.split(",") if address.strip()]
+    if not servers:
+        raise ValueError("At least one memcached address is required")
+
+    for server in servers:
+        host, _, port = server.rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"Invalid memcached address {server}, expected host:port")
+
+    if max_item_size <= 0:
+        raise ValueError("Cache max item size must be greater than 0")
+
+    for ttl in (ttls or {}).values():
+        if parse_duration(ttl) <= 0:
+            raise ValueError("Cache TTLs must be greater than 0")
+
+    cfg = {
+        "backend": "memcached",
+        "memcached": {"addresses": ",".join(servers), "max_item_size": max_item_size},
+        **(ttls or {}),
+    }
+
+    return cfg
+
+
+def frontend_config(
+    peers,
+    results_cache=None,
+    split_queries_by_interval="24h",
+    parallelize_shardable_queries=True,
+    max_outstanding_per_tenant=100,
+):
+    """Mimir frontend configuration.
+
+    Args:
+        peers: a mapping from unit names to hostnames of query frontends.
+        results_cache: an optional cache configuration, as generated by
+            :func:`cache_config`, used to cache query results.
+        split_queries_by_interval: string duration of the interval range
+            queries are split by, so that the split queries are run in
+            parallel and their results cached independently. A duration
+            of 0 disables splitting.
+        parallelize_shardable_queries: if True queries are split into
+            shards by series and the shards are run in parallel.
+        max_outstanding_per_tenant: maximum number of queued queries
+            per tenant before queries are rejected.
+
+    Raises:
+        ValueError: if any of the options is invalid.
+    """
+    parse_duration(split_queries_by_interval)
+
+    if max_outstanding_per_tenant <= 0:
+        raise ValueError("Max outstanding requests per tenant must be greater than 0")
+
+    cfg = {
+        "instance_interface_names": list(peers.values()),
+        "split_queries_by_interval": split_queries_by_interval,
+        "parallelize_shardable_queries": parallelize_shardable_queries,
+        "max_outstanding_per_tenant": max_outstanding_per_tenant,
+        "cache_results": bool(results_cache),
+    }
+
+    if results_cache:
+        cfg["results_cache"] = results_cache
+
+    return cfg
+
+
+def query_scheduler_config(max_outstanding_requests_per_tenant=100):
+    """Mimir Query Scheduler configuration.
+
+    Args:
+        max_outstanding_requests_per_tenant: maximum number of queued
+            queries per tenant before queries are rejected.
+    """
+    cfg = {"max_outstanding_requests_per_tenant": max_outstanding_requests_per_tenant}
+
+    return cfg
+
+
+def querier_lookback(retention_period, query_ingesters_within="", query_store_after=""):
+    """Time ranges over which queriers read from ingesters and store gateways.
+
+    Unless set explicitly, queriers read from ingesters for as long as
+    ingesters retain blocks locally, minus an hour of margin, and from
+    store gateways only beyond an hour less than that, so that queries
+    of recent data do not read both ingesters and object storage.
+
+    Args:
+        retention_period: string duration for which blocks are
+            retained locally by ingesters.
+        query_ingesters_within: string duration of the time range
+            queried from ingesters, or an empty string to derive it.
+        query_store_after: string duration beyond which data is
+            queried from store gateways, or an empty string to derive it.
+
+    Returns:
+        A tuple of string durations (query_ingesters_within, query_store_after).
+
+    Raises:
+        ValueError: if any of the durations is invalid or store gateways
+            are not queried for data older than ingesters hold.
+    """
+    retention = int(parse_duration(retention_period))
+    if not query_ingesters_within:
+        query_ingesters_within = format_duration(max(retention - 3600, 0))
+    ingesters_within = int(parse_duration(query_ingesters_within))
+
+    if ingesters_within > retention:
+        raise ValueError("Ingesters can not be queried beyond the TSDB block retention period")
+
+    if not query_store_after:
+        query_store_after = format_duration(max(ingesters_within - 3600, 0))
+
+    if ingesters_within and parse_duration(query_store_after) >= ingesters_within:
+        raise ValueError("query_store_after must be less than query_ingesters_within")
+
+    return query_ingesters_within, query_store_after
+
+
+def querier_config(
+    max_concurrent=20,
+    query_store_after="12h",
+    max_samples=50000000,
+    prefer_streaming_chunks=False,
+):
+    """Mimir Querier configuration.
+
+    Args:
+        max_concurrent: maximum number of queries run at the same
+            time by a querier.
+        query_store_after: string duration beyond which data is
+            queried from store gateways instead of only ingesters.
+        max_samples: maximum number of samples a query may load
+            into memory.
+        prefer_streaming_chunks: if True chunks are streamed from
+            store gateways instead of being buffered by them.
+
+    Raises:
+        ValueError: if any of the options is invalid.
+    """
+    if max_concurrent <= 0:
+        raise ValueError("Querier max concurrent queries must be greater than 0")
+
+    if max_samples <= 0:
+        raise ValueError("Querier max samples must be greater than 0")
+
+    parse_duration(query_store_after)
+
+    cfg = {
+        "max_concurrent": max_concurrent,
+        "query_store_after": query_store_after,
+        "max_samples": max_samples,
+    }
+
+    # only set when enabled since the option is experimental
+    if prefer_streaming_chunks:
+        cfg["prefer_streaming_chunks_from_store_gateways"] = True
+
+    return cfg
+
+
+def ring_config(heartbeat_period="15s", heartbeat_timeout="1m"):
+    """Mimir hash ring heartbeat configuration.
+
+    Longer heartbeat periods lower the memberlist traffic of large
+    clusters, at the cost of detecting unhealthy instances later.
+
+    Args:
+        heartbeat_period: string duration between heartbeats of an
+            instance to its ring.
+        heartbeat_timeout: string duration after which an instance
+            that has not sent a heartbeat is considered unhealthy.
+
+    Raises:
+        ValueError: if the heartbeat timeout does not exceed the period.
+    """
+    period = parse_duration(heartbeat_period)
+    if period <= 0:
+        raise ValueError("Ring heartbeat period must be greater than 0")
+
+    if parse_duration(heartbeat_timeout) <= period:
+        raise ValueError("Ring heartbeat timeout must exceed the heartbeat period")
+
+    cfg = {"heartbeat_period": heartbeat_period, "heartbeat_timeout": heartbeat_timeout}
+
+    return cfg
+
+
+def compactor_config(
+    instance_addr,
+    cleanup_interval="15m",
+    compaction_concurrency=1,
+    block_ranges="2h,12h,24h",
+    deletion_delay="12h",
+    ring=None,
+):
+    """Mimir Compactor configuration.
+
+    Tenants are spread across all compactors through the compactor
+    sharding ring.
+
+    Args:
+        instance_addr: string address of this unit in the compactor ring.
+        cleanup_interval: string duration between cleanups of deleted
+            blocks, each of which also updates the bucket index.
+        compaction_concurrency: number of compactions a compactor runs
+            at the same time.
+        block_ranges: a string comma separated list of durations of
+            the blocks produced at each compaction level. The first
+            range must be the 2h range of blocks shipped by ingesters
+            and each range must be a multiple of the previous one.
+        deletion_delay: string duration between marking a compacted
+            block for deletion and deleting it, during which queriers
+            and store gateways stop using it.
+        ring: an optional dictionary of additional ring settings, as
+            built by :func:`ring_config`.
+
+    Raises:
+        ValueError: if any of the options is invalid.
+    """
+    if parse_duration(cleanup_interval) <= 0:
+        raise ValueError("Compactor cleanup interval must be greater than 0")
+
+    if compaction_concurrency <= 0:
+        raise ValueError("Compaction concurrency must be greater than 0")
+
+    ranges = [block_range.strip() for block_range in block_ranges.split(",")]
+    durations = [parse_duration(block_range) for block_range in ranges]
+    if durations[0] != DURATION_UNITS["h"] * 2:
+        raise ValueError("The first compactor block range must be 2h")
+    for previous, current in zip(durations, durations[1:]):
+        if current <= previous or current % previous:
+            raise ValueError("Compactor block ranges must be increasing multiples of each other")
+
+    if parse_duration(deletion_delay) <= 0:
+        raise ValueError("Compactor deletion delay must be greater than 0")
+
     cfg = {
         "data_dir": MIMIR_DIRS["compactor"],
-        "sharding_ring": {"kvstore": {"store": "memberlist"}},
+        "cleanup_interval": cleanup_interval,
+        "compaction_concurrency": compaction_concurrency,
+        "block_ranges": ranges,
+        "deletion_delay": deletion_delay,
+        "sharding_ring": {
+            "instance_addr": instance_addr,
+            "kvstore": {"store": "memberlist"},
+            **(ring or {}),
+        },
+    }
+
+    return cfg
+
+
+def _derived_limit(value, memory_limit, share, unit_bytes):
+    """Resolve an instance limit that may be derived from a memory limit.
+
+    Args:
+        value: the requested limit, where -1 derives the limit from
+            the memory limit and 0 disables the limit.
+        memory_limit: memory limit in bytes or None if there is none.
+        share: fraction of the memory limit the limited resource may use.
+        unit_bytes: approximate memory used by one limited resource.
+
+    Returns:
+        The limit, which is 0 if it is derived but there is no memory limit.
+
+    Raises:
+        ValueError: if the requested limit is invalid.
+    """
+    if value < -1:
+        raise ValueError("Instance limits must be -1, 0 or greater")
+
+    if value != -1:
+        return value
+
+    if not memory_limit:
+        return 0
+
+    return max(1, int(memory_limit * share) // unit_bytes)
+
+
+def ingester_instance_limits(
+    memory_limit=None,
+    max_series=-1,
+    max_tenants=0,
+    max_inflight_push_requests=-1,
+    max_ingestion_rate=0,
+):
+    """Mimir Ingester instance limits.
+
+    Instance limits make an ingester reject pushes once reached,
+    instead of running out of memory. Limits of 0 disable the
+    corresponding limit and limits of -1 are derived from the
+    memory limit of the Mimir container.
+
+    Args:
+        memory_limit: memory limit of the Mimir container in bytes
+            or None if there is none.
+        max_series: in-memory series across all tenants.
+        max_tenants: in-memory tenants.
+        max_inflight_push_requests: push requests handled at the same time.
+        max_ingestion_rate: samples per second across all tenants.
+
+    Raises:
+        ValueError: if any of the limits is invalid.
+    """
+    if max_tenants < 0:
+        raise ValueError("Ingester max tenants must not be negative")
+
+    if max_ingestion_rate < 0:
+        raise ValueError("Ingester max ingestion rate must not be negative")
+
+    cfg = {
+        "max_ingestion_rate": max_ingestion_rate,
+        "max_tenants": max_tenants,
+        "max_series": _derived_limit(
+            max_series, memory_limit, SERIES_MEMORY_SHARE, SERIES_MEMORY_BYTES
+        ),
+        "max_inflight_push_requests": _derived_limit(
+            max_inflight_push_requests,
+            memory_limit,
+            PUSH_REQUEST_MEMORY_SHARE,
+            PUSH_REQUEST_MEMORY_BYTES,
+        ),
+    }
+
+    return cfg
+
+
+def distributor_instance_limits(
+    memory_limit=None, max_inflight_push_requests=-1, max_ingestion_rate=0
+):
+    """Mimir Distributor instance limits.
+
+    Limits of 0 disable the corresponding limit and limits of -1 are
+    derived from the memory limit of the Mimir container.
+
+    Args:
+        memory_limit: memory limit of the Mimir container in bytes
+            or None if there is none.
+        max_inflight_push_requests: push requests handled at the same time.
+        max_ingestion_rate: samples per second across all tenants.
+
+    Raises:
+        ValueError: if any of the limits is invalid.
+    """
+    if max_ingestion_rate < 0:
+        raise ValueError("Distributor max ingestion rate must not be negative")
+
+    cfg = {
+        "max_ingestion_rate": max_ingestion_rate,
+        "max_inflight_push_requests": _derived_limit(
+            max_inflight_push_requests,
+            memory_limit,
+            PUSH_REQUEST_MEMORY_SHARE,
+            PUSH_REQUEST_MEMORY_BYTES,
+        ),
     }
 
     return cfg
 
 
-def distributor_config():
-    """Mimir Distributor configuration."""
-    cfg = {"ring": {"instance_addr": "127.0.0.1", "kvstore": {"store": "memberlist"}}}
+def distributor_config(instance_addr, instance_limits=None, ring=None):
+    """Mimir Distributor configuration.
+
+    Args:
+        instance_addr: string address of this unit in the distributor ring.
+        instance_limits: an optional dictionary of distributor instance limits.
+        ring: an optional dictionary of additional ring settings, as
+            built by :func:`ring_config`.
+    """
+    cfg = {
+        "ring": {
+            "instance_addr": instance_addr,
+            "kvstore": {"store": "memberlist"},
+            **(ring or {}),
+        }
+    }
+
+    if instance_limits:
+        cfg["instance_limits"] = instance_limits
 
     return cfg
 
 
-def ingester_config():
-    """Mimir Ingestor configuration."""
+def ingester_config(instance_addr, replication_factor, instance_limits=None, ring=None, zone=None):
+    """Mimir Ingestor configuration.
+
+    Args:
+        instance_addr: string address of this unit in the ingester ring.
+        replication_factor: number of ingesters each series is written to.
+        instance_limits: an optional dictionary of ingester instance limits.
+        ring: an optional dictionary of additional ring settings, as
+            built by :func:`ring_config`.
+        zone: an optional string availability zone of this unit. If set
+            the replicas of each series are written to ingesters in
+            different zones.
+    """
     cfg = {
         "ring": {
-            "instance_addr": "127.0.0.1",
+            "instance_addr": instance_addr,
             "kvstore": {
                 "store": "memberlist",
             },
-            "replication_factor": 1,
+            "replication_factor": replication_factor,
+            "tokens_file_path": f"{MIMIR_DIRS['tokens']}/ingester.tokens",
+            **(ring or {}),
         }
     }
 
+    if zone:
+        cfg["ring"]["zone_awareness_enabled"] = True
+        cfg["ring"]["instance_availability_zone"] = zone
+
+    if instance_limits:
+        cfg["instance_limits"] = instance_limits
+
     return cfg
 
 
-def ruler_config():
-    """Mimir Ruler configuration."""
-    cfg = {"alertmanager_url": f"http://localhost:{MIMIR_PORT}/alertmanager"}
+def ruler_config(alertmanager_host="localhost"):
+    """Mimir Ruler configuration.
+
+    Args:
+        alertmanager_host: a string hostname of the Mimir Alertmanager
+            the ruler sends alerts to.
+    """
+    cfg = {"alertmanager_url": f"http://{alertmanager_host}:{MIMIR_PORT}/alertmanager"}
 
     return cfg
 
@@ -89,16 +1051,54 @@ def ruler_storage_config():
     return cfg
 
 
-def server_config():
-    """Mimir Server configuration."""
-    cfg = {"http_listen_port": MIMIR_PORT, "log_level": "error"}
+def server_config(grpc_max_message_size=104857600, grpc_max_concurrent_streams=100):
+    """Mimir Server configuration.
+
+    Args:
+        grpc_max_message_size: maximum size in bytes of a gRPC message
+            sent or received, such as a push request or query result.
+        grpc_max_concurrent_streams: maximum number of concurrent gRPC
+            streams per connection.
+
+    Raises:
+        ValueError: if any of the options is invalid.
+    """
+    if grpc_max_message_size <= 0:
+        raise ValueError("gRPC max message size must be greater than 0")
+
+    if grpc_max_concurrent_streams <= 0:
+        raise ValueError("gRPC max concurrent streams must be greater than 0")
+
+    cfg = {
+        "http_listen_port": MIMIR_PORT,
+        "grpc_listen_port": MIMIR_GRPC_PORT,
+        "grpc_server_max_recv_msg_size": grpc_max_message_size,
+        "grpc_server_max_send_msg_size": grpc_max_message_size,
+        "grpc_server_max_concurrent_streams": grpc_max_concurrent_streams,
+        "log_level": "error",
+    }
 
     return cfg
 
 
-def store_gateway_config():
-    """Mimir Store Gateway configuration."""
-    cfg = {"sharding_ring": {"replication_factor": 1}}
+def store_gateway_config(instance_addr, replication_factor, ring=None):
+    """Mimir Store Gateway configuration.
+
+    Args:
+        instance_addr: string address of this unit in the store gateway ring.
+        replication_factor: number of store gateways each block is loaded by.
+        ring: an optional dictionary of additional ring settings, as
+            built by :func:`ring_config`.
+    """
+    cfg = {
+        "sharding_ring": {
+            "instance_addr": instance_addr,
+            "kvstore": {"store": "memberlist"},
+            "replication_factor": replication_factor,
+            "tokens_file_path": f"{MIMIR_DIRS['tokens']}/store-gateway.tokens",
+            **(ring or {}),
+        }
+    }
 
     return cfg
 
@@ -113,7 +1113,7 @@ def alertmanager_storage_config():
     return cfg
 
 
-def memberlist_config(nodename, peers):
+def memberlist_config(nodename, peers, discovery_addresses=None):
     """Mimir Member List configuration.
 
     Each member of a Mimir cluster needs to set its own "memberlist".
@@ -125,7 +1125,19 @@ def memberlist_config(nodename, peers):
             which are part of the current Mimir cluster. Each dictionary
             in this list has as its values the hostnames of the memberlist.
             The keys are typical the node names.
+        discovery_addresses: an optional list of DNS names that resolve
+            to the addresses of members, such as those of headless
+            Kubernetes services. If provided members are discovered
+            through DNS lookups instead of the list of peers, so that
+            the configuration does not change as members come and go.
     """
-    cfg = {"node_name": nodename, "join_members": list(peers.values())}
+    if discovery_addresses:
+        join_members = [
+            f"dns+{address}:{MIMIR_MEMBERLIST_PORT}" for address in discovery_addresses
+        ]
+    else:
+        join_members = list(peers.values())
+
+    cfg = {"node_name": nodename, "join_members": join_members}
 
     return cfg
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Kubernetes resources managed by the Mimir charm."""
+
+import logging
+
+from lightkube import ApiError, Client
+from lightkube.models.core_v1 import ServicePort, ServiceSpec
+from lightkube.models.meta_v1 import ObjectMeta
+from lightkube.resources.apps_v1 import StatefulSet
+from lightkube.resources.core_v1 import Node, Pod, Service
+from lightkube.types import PatchType
+from lightkube.utils.quantity import parse_quantity
+from ops.framework import Object
+
+logger = logging.getLogger(__name__)
+
+ZONE_LABEL = "topology.kubernetes.io/zone"
+HOSTNAME_LABEL = "kubernetes.io/hostname"
+POD_ANTI_AFFINITY_MODES = ("none", "soft", "hard")
+
+
+class KubernetesHeadlessService(Object):
+    """A headless Kubernetes service selecting all pods of an application.
+
+    A headless service has no cluster IP. Instead a DNS lookup of
+    the service name resolves to the addresses of all pods selected
+    by the service, which allows these pods to discover each other.
+    """
+
+    def __init__(self, charm, service_name, ports):
+        """Construct a headless service.
+
+        Args:
+            charm: the charm whose pods are selected by the service.
+            service_name: string name of the headless service.
+            ports: a list of tuples (name, port) for every service port.
+        """
+        super().__init__(charm, "kubernetes-headless-service")
+        self.charm = charm
+        self.service_name = service_name
+        self.ports = ports
+
+        self.framework.observe(charm.on.install, self._create)
+        self.framework.observe(charm.on.leader_elected, self._create)
+        self.framework.observe(charm.on.upgrade_charm, self._create)
+
+    def _service_object(self):
+        """A representation of the headless service."""
+        selector = {"app.kubernetes.io/name": self.charm.app.name}
+        return Service(
+            apiVersion="v1",
+            kind="Service",
+            metadata=ObjectMeta(
+                namespace=self.namespace,
+                name=self.service_name,
+                labels=selector,
+            ),
+            spec=ServiceSpec(
+                clusterIP="None",
+                publishNotReadyAddresses=True,
+                selector=selector,
+                ports=[ServicePort(name=name, port=port) for name, port in self.ports],
+            ),
+        )
+
+    def _create(self, _):
+        """Create or update the headless service."""
+        if not self.charm.unit.is_leader():
+            return
+
+        client = Client()
+        try:
+            client.apply(self._service_object(), field_manager=self.charm.app.name)
+        except ApiError as e:
+            if e.status.code == 403:
+                logger.error("Kubernetes service creation failed: `juju trust` this application.")
+            else:
+                logger.error("Kubernetes service creation failed: %s", str(e))
+        else:
+            logger.info("Kubernetes service '%s' created successfully", self.service_name)
+
+    @property
+    def namespace(self):
+        """The Kubernetes namespace of the service."""
+        return self.charm.model.name
+
+    @property
+    def address(self):
+        """Fully qualified DNS name of the headless service."""
+        return f"{self.service_name}.{self.namespace}.svc.cluster.local"
+
+
+def resource_requirements(cpu_request="", memory_request="", cpu_limit="", memory_limit=""):
+    """Resource requirements of a container.
+
+    Args:
+        cpu_request: string Kubernetes CPU quantity such as "500m",
+            or an empty string for no request.
+        memory_request: string Kubernetes memory quantity such as
+            "1Gi", or an empty string for no request.
+        cpu_limit: string Kubernetes CPU quantity, or an empty string
+            for no limit.
+        memory_limit: string Kubernetes memory quantity, or an empty
+            string for no limit.
+
+    Returns:
+        A dictionary of container resource requirements in which
+        unset quantities are None, so that patching a container with
+        these requirements also removes unset quantities.
+
+    Raises:
+        ValueError: if a quantity is invalid or a request exceeds its limit.
+    """
+    quantities = {
+        "requests": {"cpu": cpu_request or None, "memory": memory_request or None},
+        "limits": {"cpu": cpu_limit or None, "memory": memory_limit or None},
+    }
+
+    parsed = {}
+    for kind, resources in quantities.items():
+        for resource, quantity in resources.items():
+            if quantity is not None:
+                try:
+                    parsed[kind, resource] = parse_quantity(quantity)
+                except ValueError:
+                    raise ValueError(f"Invalid {resource} {kind[:-1]} quantity: {quantity!r}")
+
+    for resource in ("cpu", "memory"):
+        request = parsed.get(("requests", resource))
+        limit = parsed.get(("limits", resource))
+        if request is not None and limit is not None and request > limit:
+            raise ValueError(f"The {resource} request must not exceed the {resource} limit")
+
+    return quantities
+
+
+def pod_anti_affinity(app_name, mode="none"):
+    """Anti-affinity of the pods of an application to each other.
+
+    Args:
+        app_name: string name of the application.
+        mode: "hard" to never schedule two pods of the application
+            on the same node, "soft" to avoid doing so if possible,
+            or "none" to not constrain scheduling.
+
+    Returns:
+        A dictionary of pod anti-affinity, which is None if disabled
+        so that patching a pod spec with it removes any anti-affinity.
+
+    Raises:
+        ValueError: if the mode is invalid.
+    """
+    if mode not in POD_ANTI_AFFINITY_MODES:
+        raise ValueError(
+            f"Invalid pod anti-affinity {mode!r}, expected one of "
+            f"{', '.join(POD_ANTI_AFFINITY_MODES)}"
+        )
+
+    term = {
+        "labelSelector": {"matchLabels": {"app.kubernetes.io/name": app_name}},
+        "topologyKey": HOSTNAME_LABEL,
+    }
+
+    if mode == "hard":
+        return {"requiredDuringSchedulingIgnoredDuringExecution": [term]}
+
+    if mode == "soft":
+        return {
+            "preferredDuringSchedulingIgnoredDuringExecution": [
+                {"weight": 100, "podAffinityTerm": term}
+            ]
+        }
+
+    return None
+
+
+def topology_spread_constraints(app_name, max_skew=0):
+    """Constraints spreading the pods of an application across zones.
+
+    Args:
+        app_name: string name of the application.
+        max_skew: maximum difference between the number of pods of
+            the application in any two zones, or 0 to not spread pods.
+
+    Returns:
+        A list of topology spread constraints, which is None if
+        disabled so that patching a pod spec with it removes any
+        constraints.
+
+    Raises:
+        ValueError: if the maximum skew is negative.
+    """
+    if max_skew < 0:
+        raise ValueError("Topology spread max skew must not be negative")
+
+    if not max_skew:
+        return None
+
+    return [
+        {
+            "maxSkew": max_skew,
+            "topologyKey": ZONE_LABEL,
+            "whenUnsatisfiable": "ScheduleAnyway",
+            "labelSelector": {"matchLabels": {"app.kubernetes.io/name": app_name}},
+        }
+    ]
+
+
+def node_zone(pod_name, namespace):
+    """Availability zone of the node a pod runs on.
+
+    Args:
+        pod_name: string name of the pod.
+        namespace: string Kubernetes namespace of the pod.
+
+    Returns:
+        The zone label of the node of the pod, or None if the pod or
+        its node can not be read or the node has no zone label.
+    """
+    client = Client()
+    try:
+        pod = client.get(Pod, pod_name, namespace=namespace)
+        node = client.get(Node, pod.spec.nodeName)
+    except ApiError as e:
+        if e.status.code == 403:
+            logger.error("Kubernetes node lookup failed: `juju trust` this application.")
+        else:
+            logger.error("Kubernetes node lookup failed: %s", str(e))
+        return None
+
+    return (node.metadata.labels or {}).get(ZONE_LABEL)
+
+
+class KubernetesStatefulSetPatch(Object):
+    """A patch of the pod template of the StatefulSet of an application.
+
+    Juju creates the StatefulSet of an application and may recreate
+    it on upgrades, so the patch is applied again on every upgrade
+    and whenever the charm configuration changes. Applying a patch
+    that does not change the pod template does not restart any pods.
+    """
+
+    def __init__(self, charm, pod_spec):
+        """Construct a StatefulSet patch.
+
+        Args:
+            charm: the charm whose StatefulSet is patched.
+            pod_spec: a callable returning a dictionary of pod spec
+                fields, which is applied as a strategic merge patch
+                to the pod template of the StatefulSet. The callable
+                may raise a ValueError if the charm is misconfigured,
+                in which case the StatefulSet is not patched.
+        """
+        super().__init__(charm, "kubernetes-statefulset-patch")
+        self.charm = charm
+        self._pod_spec = pod_spec
+
+        self.framework.observe(charm.on.config_changed, self._patch)
+        self.framework.observe(charm.on.upgrade_charm, self._patch)
+        self.framework.observe(charm.on.leader_elected, self._patch)
+
+    def _patch(self, _):
+        """Patch the pod template of the StatefulSet."""
+        if not self.charm.unit.is_leader():
+            return
+
+        try:
+            pod_spec = self._pod_spec()
+        except ValueError as e:
+            logger.error("Kubernetes StatefulSet not patched: %s", str(e))
+            return
+
+        patch = {"spec": {"template": {"spec": pod_spec}}}
+        client = Client()
+        try:
+            client.patch(
+                StatefulSet,
+                self.charm.app.name,
+                patch,
+                namespace=self.charm.model.name,
+                patch_type=PatchType.STRATEGIC,
+                field_manager=self.charm.app.name,
+            )
+        except ApiError as e:
+            if e.status.code == 403:
+                logger.error("Kubernetes StatefulSet patch failed: `juju trust` this application.")
+            else:
+                logger.error("Kubernetes StatefulSet patch failed: %s", str(e))
+        else:
+            logger.info("Kubernetes StatefulSet '%s' patched successfully", self.charm.app.name)
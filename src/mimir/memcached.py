@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Memcached servers caching Mimir data in a sidecar container.
+
+Every cache used by Mimir, such as the query results cache or the
+store gateway index cache, is served by a separate memcached server
+listening on its own port, so that each cache has its own memory
+budget and item size limit.
+"""
+
+import logging
+
+from ops.framework import Object
+
+logger = logging.getLogger(__name__)
+
+MEMCACHED_USER = "memcache"
+
+
+def memcached_command(port, memory_limit, max_item_size):
+    """Command line of a memcached server.
+
+    Args:
+        port: TCP port the server listens on.
+        memory_limit: memory used for items in MiB.
+        max_item_size: maximum size of an item in bytes, which
+            memcached requires to be at most half the memory limit.
+
+    Raises:
+        ValueError: if the memory or item size limits are invalid.
+    """
+    if memory_limit <= 0:
+        raise ValueError("Cache size must be greater than 0")
+
+    if not 1024 <= max_item_size <= memory_limit * 1024 * 1024 // 2:
+        raise ValueError("Cache max item size must be between 1KiB and half the cache size")
+
+    return (
+        f"memcached --port={port} --udp-port=0 --user={MEMCACHED_USER}"
+        f" --memory-limit={memory_limit} --max-item-size={max_item_size}"
+    )
+
+
+class Memcached(Object):
+    """Memcached servers run in a sidecar container."""
+
+    def __init__(self, charm, container_name, servers):
+        """Construct memcached servers.
+
+        Args:
+            charm: the charm whose pods run the sidecar container.
+            container_name: string name of the sidecar container.
+            servers: a callable that returns a mapping from cache names
+                to memcached command lines, for every cache that must
+                be served. Servers of caches not in the mapping are
+                stopped. The callable may raise a ValueError if the
+                caches are misconfigured.
+        """
+        super().__init__(charm, container_name)
+        self._container_name = container_name
+        self._servers = servers
+
+        self.framework.observe(charm.on[container_name].pebble_ready, self._configure)
+        self.framework.observe(charm.on.config_changed, self._configure)
+        self.framework.observe(charm.on.upgrade_charm, self._configure)
+
+    def _configure(self, _):
+        """Start, restart or stop memcached servers as configured."""
+        container = self.model.unit.get_container(self._container_name)
+        if not container.can_connect():
+            return
+
+        try:
+            servers = self._servers()
+        except ValueError as e:
+            logger.error("Invalid cache configuration: %s", e)
+            return
+
+        current = container.get_plan().services
+        services = {
+            f"memcached-{name}": {
+                "override": "replace",
+                "summary": f"memcached {name} cache",
+                "command": command,
+                "startup": "enabled",
+            }
+            for name, command in servers.items()
+        }
+        stale = [name for name in current if name not in services]
+        for name in stale:
+            services[name] = {
+                **current[name].to_dict(),
+                "override": "replace",
+                "startup": "disabled",
+            }
+
+        layer = {"summary": "memcached layer", "services": services}
+        container.add_layer(self._container_name, layer, combine=True)
+
+        if stale:
+            running = container.get_services(*stale)
+            if stopped := [name for name, service in running.items() if service.is_running()]:
+                container.stop(*stopped)
+        container.replan()
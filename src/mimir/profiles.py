@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Sizing profiles that tune Mimir for a class of deployments.
+
+A profile maps charm configuration options to values suited to
+deployments of a given size. Options that size Mimir for the
+resources of a unit, such as query concurrency and cache sizes, are
+scaled from the CPU and memory limits of the Mimir container, or
+from the nominal resources of the profile if the container has no
+limits. The "custom" profile leaves all options at their defaults.
+"""
+
+MIB = 1024 * 1024
+
+PROFILES = ("small", "medium", "large", "custom")
+
+# nominal CPUs and memory in bytes of a unit of each profile
+PROFILE_RESOURCES = {
+    "small": (1, 2 * 1024 * MIB),
+    "medium": (4, 8 * 1024 * MIB),
+    "large": (16, 32 * 1024 * MIB),
+}
+
+# options that do not depend on the resources of a unit
+PROFILE_OPTIONS = {
+    "small": {
+        "ingestion_rate": 10000.0,
+        "ingestion_burst_size": 200000,
+        "max_global_series_per_user": 150000,
+        "query_sharding_total_shards": 4,
+        "query_max_outstanding_requests_per_tenant": 100,
+        "store_gateway_block_sync_concurrency": 10,
+        "grpc_max_message_size": 64 * MIB,
+        "grpc_max_concurrent_streams": 100,
+        "ring_heartbeat_period": "15s",
+        "ring_heartbeat_timeout": "1m",
+    },
+    "medium": {
+        "ingestion_rate": 50000.0,
+        "ingestion_burst_size": 1000000,
+        "max_global_series_per_user": 1500000,
+        "query_sharding_total_shards": 16,
+        "query_max_outstanding_requests_per_tenant": 400,
+        "store_gateway_block_sync_concurrency": 20,
+        "grpc_max_message_size": 100 * MIB,
+        "grpc_max_concurrent_streams": 500,
+        "ring_heartbeat_period": "15s",
+        "ring_heartbeat_timeout": "1m",
+    },
+    "large": {
+        "ingestion_rate": 200000.0,
+        "ingestion_burst_size": 4000000,
+        "max_global_series_per_user": 10000000,
+        "query_sharding_total_shards": 32,
+        "query_max_outstanding_requests_per_tenant": 800,
+        "store_gateway_block_sync_concurrency": 40,
+        "grpc_max_message_size": 256 * MIB,
+        "grpc_max_concurrent_streams": 1000,
+        "ring_heartbeat_period": "30s",
+        "ring_heartbeat_timeout": "2m",
+    },
+}
+
+# shares of the memory of a unit used by each memcached cache
+CACHE_MEMORY_SHARES = {
+    "results": 0.05,
+    "index": 0.10,
+    "chunks": 0.15,
+    "metadata": 0.02,
+}
+
+
+def profile_options(profile, cpus=None, memory=None):
+    """Charm configuration options set by a sizing profile.
+
+    Args:
+        profile: string name of a profile, one of :data:`PROFILES`.
+        cpus: number of CPUs the Mimir container is limited to, or None
+            to use the nominal CPUs of the profile.
+        memory: memory in bytes the Mimir container is limited to, or
+            None to use the nominal memory of the profile.
+
+    Returns:
+        A mapping from charm configuration option names to values.
+
+    Raises:
+        ValueError: if the profile is unknown.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Invalid profile {profile!r}, expected one of {', '.join(PROFILES)}")
+
+    if profile == "custom":
+        return {}
+
+    nominal_cpus, nominal_memory = PROFILE_RESOURCES[profile]
+    cpus = max(1, round(cpus or nominal_cpus))
+    memory_mib = (memory or nominal_memory) // MIB
+
+    options = {
+        **PROFILE_OPTIONS[profile],
+        "querier_max_concurrent": max(4, 4 * cpus),
+        "store_gateway_max_concurrent": max(20, 25 * cpus),
+        "compactor_concurrency": max(1, cpus // 4),
+    }
+    for name, share in CACHE_MEMORY_SHARES.items():
+        options[f"{name}_cache_size"] = max(16, int(memory_mib * share))
+
+    return options
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Rolling restarts of Mimir units coordinated over the peer relation.
+
+Each unit that needs a restart records a request in its peer unit
+data bag. The leader grants restart locks, by listing the unit names
+holding a lock in the peer application data bag, to at most a fixed
+number of units at a time. A unit restarts only once it holds a lock
+and releases the lock, by clearing its request, once Mimir reports
+that it is ready again. A restart requested while a unit holds its
+lock is performed immediately, since the unit is already counted as
+restarting, and the lock is held until Mimir is ready after the latest
+restart.
+"""
+
+import json
+import logging
+import time
+
+from ops.framework import Object, StoredState
+
+logger = logging.getLogger(__name__)
+
+RESTART_REQUEST_KEY = "restart_request"
+RESTART_GRANTS_KEY = "restart_grants"
+
+
+class RollingRestart(Object):
+    """Restart units of an application a few at a time."""
+
+    _stored = StoredState()
+
+    def __init__(
+        self, charm, relation_name, restart, is_ready, max_parallel=1, timeout=5, interval=1
+    ):
+        """Construct a rolling restart coordinator.
+
+        Args:
+            charm: the charm that requires rolling restarts.
+            relation_name: string name of the peer relation used to
+                coordinate restarts.
+            restart: a callable that restarts the workload of this unit.
+            is_ready: a callable that returns True once the restarted
+                workload of this unit is ready.
+            max_parallel: maximum number of units that may be restarting
+                at the same time.
+            timeout: maximum time in seconds a hook waits for the
+                restarted workload to become ready. Readiness is checked
+                again on later update status and peer relation events.
+            interval: time in seconds between readiness checks.
+        """
+        super().__init__(charm, relation_name)
+        self._charm = charm
+        self._relation_name = relation_name
+        self._restart = restart
+        self._is_ready = is_ready
+        self._max_parallel = max(1, max_parallel)
+        self._timeout = timeout
+        self._interval = interval
+        self._stored.set_default(restarting=False, restart_again=False)
+
+        events = charm.on[relation_name]
+        self.framework.observe(events.relation_changed, self._on_restart_state_changed)
+        self.framework.observe(events.relation_departed, self._on_restart_state_changed)
+        self.framework.observe(charm.on.leader_elected, self._on_restart_state_changed)
+        self.framework.observe(charm.on.update_status, self._on_restart_state_changed)
+
+    def request_restart(self):
+        """Request a restart of this unit.
+
+        If this unit has no peers it is restarted immediately,
+        otherwise it is restarted once the leader grants it a
+        restart lock.
+        """
+        relation = self._relation
+
+        if not relation or not relation.units:
+            self._restart()
+            return
+
+        data = relation.data[self.model.unit]
+        if not data.get(RESTART_REQUEST_KEY):
+            data[RESTART_REQUEST_KEY] = str(time.time())
+            logger.info("Requested rolling restart of %s", self.model.unit.name)
+        elif self._stored.restarting:
+            # the restart in progress may predate the change requiring this one
+            self._stored.restart_again = True
+            logger.info("Requested another restart of %s", self.model.unit.name)
+
+        self._process(relation)
+
+    @property
+    def restart_pending(self):
+        """Check if this unit is waiting for or is in the middle of a restart.
+
+        Returns:
+            True if this unit has an outstanding restart request.
+        """
+        relation = self._relation
+
+        if not relation:
+            return False
+
+        return bool(relation.data[self.model.unit].get(RESTART_REQUEST_KEY))
+
+    def _on_restart_state_changed(self, _):
+        """Grant, perform or release restart locks as required."""
+        if relation := self._relation:
+            self._process(relation)
+
+    def _process(self, relation):
+        """Grant restart locks if leader and restart this unit if it holds one."""
+        if self.model.unit.is_leader():
+            self._grant(relation)
+
+        self._restart_if_granted(relation)
+
+    def _grant(self, relation):
+        """Grant restart locks to units in the order they requested them.
+
+        Locks held by units that have since released them, or departed,
+        are dropped before new locks are granted.
+        """
+        requests = {}
+        for unit in [self.model.unit, *relation.units]:
+            if requested_at := relation.data[unit].get(RESTART_REQUEST_KEY):
+                requests[unit.name] = float(requested_at)
+
+        grants = [name for name in self._grants(relation) if name in requests]
+        for name in sorted(requests, key=lambda name: (requests[name], name)):
+            if len(grants) >= self._max_parallel:
+                break
+            if name not in grants:
+                grants.append(name)
+                logger.info("Granted rolling restart lock to %s", name)
+
+        if grants != self._grants(relation):
+            relation.data[self.model.app][RESTART_GRANTS_KEY] = json.dumps(grants)
+
+    def _restart_if_granted(self, relation):
+        """Restart this unit if it holds a lock and release the lock once ready."""
+        data = relation.data[self.model.unit]
+        if not data.get(RESTART_REQUEST_KEY):
+            return
+
+        if self.model.unit.name not in self._grants(relation):
+            logger.debug("Waiting for rolling restart lock")
+            return
+
+        # the configuration that is keeping Mimir from becoming ready may
+        # be the one a repeated restart is meant to replace
+        if not self._stored.restarting or self._stored.restart_again:
+            self._restart()
+            self._stored.restarting = True
+            self._stored.restart_again = False
+
+        if not self._wait_until_ready():
+            logger.warning("Holding rolling restart lock until Mimir is ready")
+            return
+
+        self._stored.restarting = False
+        del data[RESTART_REQUEST_KEY]
+        logger.info("Released rolling restart lock of %s", self.model.unit.name)
+
+        if self.model.unit.is_leader():
+            self._grant(relation)
+
+    def _wait_until_ready(self):
+        """Wait for the restarted workload to become ready.
+
+        Returns:
+            True if the workload became ready before the timeout.
+        """
+        attempts = max(1, int(self._timeout / self._interval))
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(self._interval)
+            if self._is_ready():
+                return True
+
+        return False
+
+    def _grants(self, relation):
+        """Names of units currently holding a restart lock."""
+        return json.loads(relation.data[self.model.app].get(RESTART_GRANTS_KEY, "[]"))
+
+    @property
+    def _relation(self):
+        """The peer relation used to coordinate restarts."""
+        return self.model.get_relation(self._relation_name)
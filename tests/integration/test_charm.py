@@ -37,7 +37,10 @@ async def test_mimir_charm_ingests_metrics_alert_rules_and_raises_alerts(
     await asyncio.gather(
         ops_test.model.deploy(
             mimir_charm,
-            resources={"mimir-image": oci_image("./metadata.yaml", "mimir-image")},
+            resources={
+                "mimir-image": oci_image("./metadata.yaml", "mimir-image"),
+                "memcached-image": oci_image("./metadata.yaml", "memcached-image"),
+            },
             application_name=mimir_app_name,
         ),
         ops_test.model.deploy(
@@ -0,0 +1,64 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+from unittest.mock import patch
+from urllib.error import HTTPError, URLError
+
+from mimir.api import MimirAPI
+
+
+class TestMimirAPI(unittest.TestCase):
+    @patch("urllib.request.urlopen")
+    def test_mimir_is_ready_on_http_ok(self, mocked_urlopen):
+        mocked_urlopen.return_value.status = 200
+        mimir = MimirAPI()
+        self.assertTrue(mimir.is_ready())
+        mocked_urlopen.assert_called()
+
+    @patch("urllib.request.urlopen")
+    def test_mimir_is_not_ready_on_http_error(self, mocked_urlopen):
+        mocked_urlopen.side_effect = HTTPError(
+            url="http://error.com", code=503, msg="Service Unavailable", hdrs={}, fp=None
+        )
+        mimir = MimirAPI()
+        self.assertFalse(mimir.is_ready())
+
+    @patch("urllib.request.urlopen")
+    def test_mimir_is_not_ready_on_url_error(self, mocked_urlopen):
+        mocked_urlopen.side_effect = URLError("Connection refused")
+        mimir = MimirAPI()
+        self.assertFalse(mimir.is_ready())
+
+    @patch("urllib.request.urlopen")
+    def test_shutting_down_ingester_posts_to_shutdown_handler(self, mocked_urlopen):
+        mocked_urlopen.return_value.status = 204
+        mimir = MimirAPI()
+        self.assertTrue(mimir.shutdown_ingester(timeout=60))
+        request = mocked_urlopen.call_args.args[0]
+        self.assertEqual(request.get_method(), "POST")
+        self.assertTrue(request.full_url.endswith("/ingester/shutdown"))
+        self.assertEqual(mocked_urlopen.call_args.kwargs["timeout"], 60)
+
+    @patch("urllib.request.urlopen")
+    def test_shutting_down_ingester_fails_on_timeout(self, mocked_urlopen):
+        mocked_urlopen.side_effect = TimeoutError()
+        mimir = MimirAPI()
+        self.assertFalse(mimir.shutdown_ingester())
+
+    @patch("urllib.request.urlopen")
+    def test_bucket_index_update_times_are_read_from_metrics(self, mocked_urlopen):
+        mocked_urlopen.return_value.read.return_value = (
+            b"# TYPE cortex_bucket_index_last_successful_update_timestamp_seconds gauge\n"
+            b'cortex_bucket_index_last_successful_update_timestamp_seconds{user="anonymous"}'
+            b" 1.6e+09\n"
+            b'cortex_bucket_index_loaded{user="anonymous"} 1\n'
+        )
+        mimir = MimirAPI()
+        self.assertEqual(mimir.bucket_index_updated_at(), {"anonymous": 1.6e09})
+
+    @patch("urllib.request.urlopen")
+    def test_bucket_index_update_times_are_unknown_without_metrics(self, mocked_urlopen):
+        mocked_urlopen.side_effect = URLError("Connection refused")
+        mimir = MimirAPI()
+        self.assertIsNone(mimir.bucket_index_updated_at())
@@ -1,6 +1,8 @@
 # Copyright 2022 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import json
+import time
 import unittest
 from unittest.mock import patch
 
@@ -10,7 +12,12 @@ from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus, WaitingSta
 from ops.testing import Harness
 
 from charm import MimirCharm
-from mimir.config import MIMIR_CONFIG_FILE
+from mimir.config import (
+    MIMIR_CONFIG_FILE,
+    MIMIR_DIRS,
+    MIMIR_RUNTIME_CONFIG_FILE,
+    MIMIR_SCRATCH_DIR,
+)
 
 S3_CONFIG = {
     "endpoint": "s3.eu-west-1.amazonaws.com",
@@ -30,6 +37,15 @@ class TestCharm(unittest.TestCase):
         self.name = "mimir"
         self.peername = "mimir-peers"
         self.addCleanup(self.harness.cleanup)
+        client_patcher = patch("mimir.kubernetes.Client")
+        self.mock_client = client_patcher.start()
+        self.addCleanup(client_patcher.stop)
+        ready_patcher = patch("mimir.api.MimirAPI.is_ready", return_value=True)
+        self.mock_is_ready = ready_patcher.start()
+        self.addCleanup(ready_patcher.stop)
+        bucket_index_patcher = patch("mimir.api.MimirAPI.bucket_index_updated_at", return_value={})
+        self.mock_bucket_index_updated_at = bucket_index_patcher.start()
+        self.addCleanup(bucket_index_patcher.stop)
         self.harness.begin()
 
     def test_peer_units_set_hostname_on_peer_relation_joined(self):
@@ -49,6 +65,26 @@ class TestCharm(unittest.TestCase):
         plan = self.harness.get_container_pebble_plan(self.name)
         self.assertIn(self.name, plan.services)
 
+    def test_pebble_layer_defines_health_checks(self):
+        self.harness.container_pebble_ready(self.name)
+        plan = self.harness.get_container_pebble_plan(self.name)
+        service = plan.services[self.name]
+        self.assertEqual(service.on_check_failure, {"mimir-alive": "restart"})
+
+        checks = self.harness.charm._pebble_layer()["checks"]
+        self.assertEqual(checks["mimir-ready"]["level"], "ready")
+        self.assertIn("/ready", checks["mimir-ready"]["http"]["url"])
+        self.assertEqual(checks["mimir-alive"]["level"], "alive")
+
+    def test_charm_waits_until_mimir_is_ready(self):
+        self.mock_is_ready.return_value = False
+        self.harness.container_pebble_ready(self.name)
+        self.assertIsInstance(self.harness.charm.unit.status, WaitingStatus)
+
+        self.mock_is_ready.return_value = True
+        self.harness.charm.on.update_status.emit()
+        self.assertIsInstance(self.harness.charm.unit.status, ActiveStatus)
+
     def test_mimir_is_reconfigured_and_restarted_on_upgrade(self):
         self.harness.container_pebble_ready(self.name)
         self.harness.charm.on.upgrade_charm.emit()
@@ -59,8 +95,94 @@ class TestCharm(unittest.TestCase):
         # Active status is set when single mimir unit is restarted
         self.assertIsInstance(self.harness.charm.unit.status, ActiveStatus)
 
+    def test_mimir_is_not_restarted_if_config_is_unchanged(self):
+        self.harness.container_pebble_ready(self.name)
+        with patch.object(self.harness.charm.restarter, "request_restart") as mock_restart:
+            self.harness.charm.on.upgrade_charm.emit()
+            self.harness.charm.on.config_changed.emit()
+            self.assertFalse(mock_restart.called)
+
+    def test_mimir_is_restarted_if_config_is_changed(self):
+        self.harness.container_pebble_ready(self.name)
+        with patch.object(self.harness.charm.restarter, "request_restart") as mock_restart:
+            self.harness.update_config({"tsdb_block_retention_period": "48h"})
+            self.assertTrue(mock_restart.called)
+
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(config["blocks_storage"]["tsdb"]["retention_period"], "48h")
+
+    @patch("urllib.request.urlopen")
+    def test_leader_grants_itself_restart_lock_and_releases_it(self, mocked_urlopen):
+        mocked_urlopen.return_value.status = 200
+        self.harness.container_pebble_ready(self.name)
+        peer_rel_id = self.harness.add_relation(self.peername, self.name)
+        self.harness.add_relation_unit(peer_rel_id, "mimir-k8s/1")
+        self.harness.set_leader(True)
+
+        with patch("ops.model.Container.restart") as mock_restart:
+            self.harness.update_config({"s3": yaml.dump(S3_CONFIG)})
+            self.assertTrue(mock_restart.called)
+
+        unit_data = self.harness.get_relation_data(peer_rel_id, self.harness.charm.unit.name)
+        self.assertFalse(unit_data.get("restart_request"))
+
+    @patch("urllib.request.urlopen")
+    def test_units_restart_one_at_a_time(self, mocked_urlopen):
+        mocked_urlopen.return_value.status = 200
+        self.harness.container_pebble_ready(self.name)
+        peer_rel_id = self.harness.add_relation(self.peername, self.name)
+        self.harness.add_relation_unit(peer_rel_id, "mimir-k8s/1")
+        self.harness.update_relation_data(peer_rel_id, "mimir-k8s/1", {"restart_request": "1.0"})
+
+        # a unit that is not granted a lock waits for its turn
+        with patch("ops.model.Container.restart") as mock_restart:
+            self.harness.update_config({"s3": yaml.dump(S3_CONFIG)})
+            self.assertFalse(mock_restart.called)
+        unit_data = self.harness.get_relation_data(peer_rel_id, self.harness.charm.unit.name)
+        self.assertTrue(unit_data.get("restart_request"))
+
+        # the leader grants the lock to the earliest request only
+        self.harness.set_leader(True)
+        app_data = self.harness.get_relation_data(peer_rel_id, self.harness.charm.app.name)
+        self.assertEqual(json.loads(app_data["restart_grants"]), ["mimir-k8s/1"])
+
+        # once the first unit releases its lock this unit is restarted
+        with patch("ops.model.Container.restart") as mock_restart:
+            self.harness.update_relation_data(peer_rel_id, "mimir-k8s/1", {"restart_request": ""})
+            self.assertTrue(mock_restart.called)
+        unit_data = self.harness.get_relation_data(peer_rel_id, self.harness.charm.unit.name)
+        self.assertFalse(unit_data.get("restart_request"))
+
+    @patch("mimir.restart.time.sleep")
+    def test_config_change_while_restarting_restarts_mimir_again(self, _):
+        self.harness.container_pebble_ready(self.name)
+        peer_rel_id = self.harness.add_relation(self.peername, self.name)
+        self.harness.add_relation_unit(peer_rel_id, "mimir-k8s/1")
+        self.harness.set_leader(True)
+        self.mock_is_ready.return_value = False
+
+        with patch("ops.model.Container.restart") as mock_restart:
+            self.harness.update_config({"tsdb_block_retention_period": "48h"})
+            self.assertEqual(mock_restart.call_count, 1)
+
+            # a change while the lock is held and Mimir is not ready
+            # restarts Mimir again without waiting for it to be ready
+            self.harness.update_config({"tsdb_block_retention_period": "72h"})
+            self.assertEqual(mock_restart.call_count, 2)
+            unit_data = self.harness.get_relation_data(peer_rel_id, self.harness.charm.unit.name)
+            self.assertTrue(unit_data.get("restart_request"))
+
+            # the lock is released once Mimir is ready after the last restart
+            self.mock_is_ready.return_value = True
+            self.harness.charm.on.update_status.emit()
+            self.assertEqual(mock_restart.call_count, 2)
+        unit_data = self.harness.get_relation_data(peer_rel_id, self.harness.charm.unit.name)
+        self.assertFalse(unit_data.get("restart_request"))
+
     def test_charm_reconfigures_mimir_on_peer_relation_chagned(self):
         # create a peer relation and unit after pebble is ready
+        self.harness.set_planned_units(2)
         self.harness.container_pebble_ready(self.name)
         peer_rel_id = self.harness.add_relation(self.peername, self.name)
         first_unit_name = "mimir-k8s/0"
@@ -88,6 +210,7 @@ class TestCharm(unittest.TestCase):
 
     def test_charm_reconfigures_mimir_on_peer_relation_departed(self):
         # create a peer relation and a unit
+        self.harness.set_planned_units(2)
         self.harness.container_pebble_ready(self.name)
         peer_rel_id = self.harness.add_relation(self.peername, self.name)
         first_unit_name = "mimir-k8s/0"
@@ -108,6 +231,7 @@ class TestCharm(unittest.TestCase):
         self.assertIn(second_unit_name, members)
 
         # remove the second unit
+        self.harness.set_planned_units(1)
         self.harness.remove_relation_unit(peer_rel_id, second_unit_name)
 
         # check Mimir memberlist has been updated to contain a single unit
@@ -117,6 +241,549 @@ class TestCharm(unittest.TestCase):
         self.assertEqual(len(members), 1)
         self.assertNotIn(second_unit_name, members)
 
+    def test_peer_reconfiguration_is_deferred_until_peers_settle(self):
+        self.harness.set_planned_units(3)
+        self.harness.container_pebble_ready(self.name)
+        peer_rel_id = self.harness.add_relation(self.peername, self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+
+        # the memberlist is not changed while planned peers are missing
+        self.harness.add_relation_unit(peer_rel_id, "mimir-k8s/1")
+        self.harness.update_relation_data(peer_rel_id, "mimir-k8s/1", {"peer_hostname": "m1"})
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(len(config["memberlist"]["join_members"]), 1)
+
+        # a single reconfiguration happens once all planned peers are known
+        self.harness.add_relation_unit(peer_rel_id, "mimir-k8s/2")
+        self.harness.update_relation_data(peer_rel_id, "mimir-k8s/2", {"peer_hostname": "m2"})
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(len(config["memberlist"]["join_members"]), 3)
+
+    def test_peer_reconfiguration_happens_after_settle_timeout(self):
+        self.harness.update_config({"peer_settle_timeout": 0})
+        self.harness.set_planned_units(3)
+        self.harness.container_pebble_ready(self.name)
+        peer_rel_id = self.harness.add_relation(self.peername, self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+
+        self.harness.add_relation_unit(peer_rel_id, "mimir-k8s/1")
+        self.harness.update_relation_data(peer_rel_id, "mimir-k8s/1", {"peer_hostname": "m1"})
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(len(config["memberlist"]["join_members"]), 1)
+
+        # deferred reconfiguration is applied once the timeout has expired
+        self.harness.charm.on.update_status.emit()
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(len(config["memberlist"]["join_members"]), 2)
+
+    def test_dns_memberlist_discovery_is_independent_of_peers(self):
+        self.harness.update_config({"memberlist_discovery": "dns"})
+        self.harness.set_planned_units(2)
+        self.harness.container_pebble_ready(self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        members = config["memberlist"]["join_members"]
+        self.assertEqual(members, ["dns+mimir-k8s-memberlist.charm_test.svc.cluster.local:7946"])
+
+        # adding a peer does not change the configuration
+        peer_rel_id = self.harness.add_relation(self.peername, self.name)
+        self.harness.add_relation_unit(peer_rel_id, "mimir-k8s/1")
+        with patch.object(self.harness.charm.restarter, "request_restart") as mock_restart:
+            self.harness.update_relation_data(
+                peer_rel_id, "mimir-k8s/1", {"peer_hostname": "mimir-k8s-1"}
+            )
+            self.assertFalse(mock_restart.called)
+
+    def test_charm_blocks_on_invalid_memberlist_discovery(self):
+        self.harness.container_pebble_ready(self.name)
+        self.harness.update_config({"memberlist_discovery": "DNS"})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+        # peer changes leave the unit blocked instead of failing
+        peer_rel_id = self.harness.add_relation(self.peername, self.name)
+        self.harness.add_relation_unit(peer_rel_id, "mimir-k8s/1")
+        self.harness.update_relation_data(peer_rel_id, "mimir-k8s/1", {"peer_hostname": "m1"})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_leader_creates_headless_memberlist_service(self):
+        self.harness.add_relation(self.peername, self.name)
+        self.harness.set_leader(True)
+        service = self.mock_client.return_value.apply.call_args.args[0]
+        self.assertEqual(service.metadata.name, "mimir-k8s-memberlist")
+        self.assertEqual(service.spec.clusterIP, "None")
+
+    def test_leader_patches_container_resources_into_statefulset(self):
+        self.harness.add_relation(self.peername, self.name)
+        self.harness.set_leader(True)
+        self.harness.update_config({"cpu_request": "1", "cpu_limit": "2", "memory_limit": "4Gi"})
+        patch_call = self.mock_client.return_value.patch.call_args
+        self.assertEqual(patch_call.args[1], "mimir-k8s")
+        container = patch_call.args[2]["spec"]["template"]["spec"]["containers"][0]
+        self.assertEqual(container["name"], self.name)
+        self.assertEqual(
+            container["resources"],
+            {
+                "requests": {"cpu": "1", "memory": None},
+                "limits": {"cpu": "2", "memory": "4Gi"},
+            },
+        )
+
+    def test_leader_patches_scheduling_constraints_into_statefulset(self):
+        self.harness.add_relation(self.peername, self.name)
+        self.harness.set_leader(True)
+        self.harness.update_config({"pod_anti_affinity": "hard", "topology_spread_max_skew": 1})
+        pod_spec = self.mock_client.return_value.patch.call_args.args[2]["spec"]["template"][
+            "spec"
+        ]
+        term = pod_spec["affinity"]["podAntiAffinity"][
+            "requiredDuringSchedulingIgnoredDuringExecution"
+        ][0]
+        self.assertEqual(term["topologyKey"], "kubernetes.io/hostname")
+        self.assertEqual(
+            term["labelSelector"]["matchLabels"], {"app.kubernetes.io/name": "mimir-k8s"}
+        )
+        constraint = pod_spec["topologySpreadConstraints"][0]
+        self.assertEqual(constraint["topologyKey"], "topology.kubernetes.io/zone")
+        self.assertEqual(constraint["maxSkew"], 1)
+
+        # disabled constraints are removed from the statefulset
+        self.harness.update_config({"pod_anti_affinity": "none", "topology_spread_max_skew": 0})
+        pod_spec = self.mock_client.return_value.patch.call_args.args[2]["spec"]["template"][
+            "spec"
+        ]
+        self.assertIsNone(pod_spec["affinity"]["podAntiAffinity"])
+        self.assertIsNone(pod_spec["topologySpreadConstraints"])
+
+    def test_charm_blocks_on_invalid_pod_anti_affinity(self):
+        self.harness.container_pebble_ready(self.name)
+        self.harness.update_config({"pod_anti_affinity": "sometimes"})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    @patch("charm.node_zone", return_value="zone-a")
+    def test_ingesters_are_zone_aware_with_node_zone(self, mock_node_zone):
+        self.harness.update_config({"zone_awareness": True})
+        self.harness.container_pebble_ready(self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        ring = config["ingester"]["ring"]
+        self.assertTrue(ring["zone_awareness_enabled"])
+        self.assertEqual(ring["instance_availability_zone"], "zone-a")
+        mock_node_zone.assert_called_once_with("mimir-k8s-0", "charm_test")
+
+    @patch("charm.node_zone", return_value=None)
+    def test_charm_blocks_on_zone_awareness_without_node_zone(self, _):
+        self.harness.update_config({"zone_awareness": True})
+        self.harness.container_pebble_ready(self.name)
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_charm_blocks_on_resource_requests_exceeding_limits(self):
+        self.harness.container_pebble_ready(self.name)
+        self.harness.update_config({"memory_request": "8Gi", "memory_limit": "4Gi"})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_mimir_runs_configured_target(self):
+        self.harness.update_config({"target": "read"})
+        self.harness.container_pebble_ready(self.name)
+        plan = self.harness.get_container_pebble_plan(self.name)
+        self.assertIn("-target=read", plan.services[self.name].command)
+
+    def test_charm_blocks_on_invalid_target(self):
+        self.harness.update_config({"target": "all,nonsense"})
+        self.harness.container_pebble_ready(self.name)
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_querier_uses_query_frontend_of_related_application(self):
+        self.harness.update_config({"target": "querier"})
+        self.harness.container_pebble_ready(self.name)
+        rel_id = self.harness.add_relation("mimir-cluster-join", "mimir-frontend")
+        self.harness.add_relation_unit(rel_id, "mimir-frontend/0")
+        self.harness.update_relation_data(
+            rel_id,
+            "mimir-frontend",
+            {
+                "components": json.dumps(["query-frontend"]),
+                "service_address": "mimir-frontend.charm_test.svc.cluster.local",
+                "memberlist_address": "mimir-frontend-memberlist.charm_test.svc.cluster.local",
+            },
+        )
+        self.harness.update_relation_data(
+            rel_id, "mimir-frontend/0", {"hostname": "mimir-frontend-0"}
+        )
+
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(
+            config["frontend_worker"]["frontend_address"],
+            "mimir-frontend.charm_test.svc.cluster.local:9095",
+        )
+        self.assertIn("mimir-frontend-0", config["memberlist"]["join_members"])
+
+    def test_ring_settings_follow_cluster_size(self):
+        self.harness.container_pebble_ready(self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(config["ingester"]["ring"]["replication_factor"], 1)
+        self.assertEqual(
+            config["ingester"]["ring"]["instance_addr"], str(self.harness.charm.hostname)
+        )
+
+        # the leader shares a replication factor bounded by the number of units
+        peer_rel_id = self.harness.add_relation(self.peername, self.name)
+        self.harness.add_relation_unit(peer_rel_id, "mimir-k8s/1")
+        self.harness.add_relation_unit(peer_rel_id, "mimir-k8s/2")
+        self.harness.set_leader(True)
+        self.harness.update_config({"s3": yaml.dump(S3_CONFIG)})
+        app_data = self.harness.get_relation_data(peer_rel_id, self.harness.charm.app.name)
+        self.assertEqual(app_data["replication_factor"], "3")
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(config["ingester"]["ring"]["replication_factor"], 3)
+        self.assertEqual(config["store_gateway"]["sharding_ring"]["replication_factor"], 3)
+
+    def test_scratch_data_is_kept_apart_from_write_ahead_log(self):
+        self.harness.container_pebble_ready(self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertTrue(config["compactor"]["data_dir"].startswith(MIMIR_SCRATCH_DIR))
+        sync_dir = config["blocks_storage"]["bucket_store"]["sync_dir"]
+        self.assertTrue(sync_dir.startswith(MIMIR_SCRATCH_DIR))
+        self.assertFalse(config["blocks_storage"]["tsdb"]["dir"].startswith(MIMIR_SCRATCH_DIR))
+        self.assertTrue(container.exists(MIMIR_DIRS["compactor"]))
+
+    def test_ring_tokens_are_persisted(self):
+        self.harness.container_pebble_ready(self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+        self.assertTrue(container.exists(MIMIR_DIRS["tokens"]))
+
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        ingester_tokens = config["ingester"]["ring"]["tokens_file_path"]
+        store_gateway_tokens = config["store_gateway"]["sharding_ring"]["tokens_file_path"]
+        self.assertTrue(ingester_tokens.startswith(MIMIR_DIRS["tokens"]))
+        self.assertTrue(store_gateway_tokens.startswith(MIMIR_DIRS["tokens"]))
+        self.assertNotEqual(ingester_tokens, store_gateway_tokens)
+
+    def test_non_leader_uses_replication_factor_shared_by_leader(self):
+        self.harness.container_pebble_ready(self.name)
+        peer_rel_id = self.harness.add_relation(self.peername, self.name)
+        self.harness.add_relation_unit(peer_rel_id, "mimir-k8s/1")
+        self.harness.update_relation_data(
+            peer_rel_id, self.harness.charm.app.name, {"replication_factor": "1"}
+        )
+        self.harness.update_config({"replication_factor": 2})
+
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(config["ingester"]["ring"]["replication_factor"], 1)
+
+    def test_tsdb_tuning_options_are_applied(self):
+        self.harness.update_config(
+            {"tsdb_wal_replay_concurrency": 8, "tsdb_memory_snapshot_on_shutdown": False}
+        )
+        self.harness.container_pebble_ready(self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        tsdb = config["blocks_storage"]["tsdb"]
+        self.assertEqual(tsdb["wal_replay_concurrency"], 8)
+        self.assertFalse(tsdb["memory_snapshot_on_shutdown"])
+        self.assertEqual(tsdb["ship_interval"], "5m")
+
+    def test_charm_blocks_on_invalid_tsdb_tuning_options(self):
+        self.harness.container_pebble_ready(self.name)
+        self.harness.update_config({"tsdb_head_compaction_interval": "1h"})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    @patch("mimir.api.MimirAPI.shutdown_ingester", return_value=True)
+    def test_ingester_is_shut_down_when_unit_is_removed(self, mock_shutdown):
+        self.harness.container_pebble_ready(self.name)
+        self.harness.set_planned_units(0)
+        self.harness.charm.on.stop.emit()
+        mock_shutdown.assert_called_once()
+
+        container = self.harness.charm.unit.get_container(self.name)
+        self.assertFalse(container.get_service(self.name).is_running())
+
+    @patch("mimir.api.MimirAPI.shutdown_ingester", return_value=True)
+    def test_unconfigured_ingester_is_not_shut_down_when_unit_is_removed(self, mock_shutdown):
+        self.harness.update_config({"tsdb_head_compaction_interval": "1h"})
+        self.harness.container_pebble_ready(self.name)
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+        self.harness.set_planned_units(0)
+        self.harness.charm.on.stop.emit()
+        mock_shutdown.assert_not_called()
+
+    @patch("mimir.api.MimirAPI.shutdown_ingester", return_value=True)
+    def test_ingester_is_not_shut_down_when_unit_is_rescheduled(self, mock_shutdown):
+        self.harness.container_pebble_ready(self.name)
+        self.harness.charm.on.stop.emit()
+        mock_shutdown.assert_not_called()
+
+    def test_limits_are_set_from_config(self):
+        self.harness.update_config({"ingestion_rate": 50000.0, "ingestion_burst_size": 500000})
+        self.harness.container_pebble_ready(self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(config["runtime_config"]["file"], MIMIR_RUNTIME_CONFIG_FILE)
+
+        runtime = yaml.safe_load(container.pull(MIMIR_RUNTIME_CONFIG_FILE))
+        limits = runtime["overrides"]["anonymous"]
+        self.assertEqual(limits["ingestion_rate"], 50000.0)
+        self.assertEqual(limits["ingestion_burst_size"], 500000)
+
+    def test_limit_changes_do_not_restart_mimir(self):
+        self.harness.container_pebble_ready(self.name)
+        with patch.object(self.harness.charm.restarter, "request_restart") as mock_restart:
+            self.harness.update_config(
+                {
+                    "max_global_series_per_user": 300000,
+                    "tenant_overrides": yaml.dump({"team-a": {"ingestion_rate": 1000}}),
+                }
+            )
+            self.assertFalse(mock_restart.called)
+
+        container = self.harness.charm.unit.get_container(self.name)
+        runtime = yaml.safe_load(container.pull(MIMIR_RUNTIME_CONFIG_FILE))
+        self.assertEqual(runtime["overrides"]["anonymous"]["max_global_series_per_user"], 300000)
+        self.assertEqual(runtime["overrides"]["team-a"], {"ingestion_rate": 1000})
+
+    def test_charm_blocks_on_invalid_tenant_overrides(self):
+        self.harness.container_pebble_ready(self.name)
+        self.harness.update_config({"tenant_overrides": "- not a mapping"})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_charm_blocks_on_invalid_limits(self):
+        self.harness.container_pebble_ready(self.name)
+        self.harness.update_config({"max_label_names_per_series": -1})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_instance_limits_are_derived_from_container_memory_limit(self):
+        container = self.harness.charm.unit.get_container(self.name)
+        self.harness.set_can_connect(container, True)
+        container.push("/sys/fs/cgroup/memory.max", str(2 * 1024**3), make_dirs=True)
+        self.harness.update_config({"ingester_max_tenants": 5})
+        self.harness.container_pebble_ready(self.name)
+
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        ingester_limits = config["ingester"]["instance_limits"]
+        self.assertEqual(ingester_limits["max_series"], 209715)
+        self.assertEqual(ingester_limits["max_tenants"], 5)
+        distributor_limits = config["distributor"]["instance_limits"]
+        self.assertEqual(distributor_limits["max_inflight_push_requests"], 4096)
+
+    def test_charm_blocks_on_invalid_instance_limits(self):
+        self.harness.container_pebble_ready(self.name)
+        self.harness.update_config({"ingester_max_series": -5})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_query_frontend_is_configured_from_config(self):
+        self.harness.update_config(
+            {
+                "query_results_cache_addresses": "memcached:11211",
+                "query_split_interval": "6h",
+                "query_sharding_total_shards": 8,
+            }
+        )
+        self.harness.container_pebble_ready(self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertTrue(config["frontend"]["cache_results"])
+        self.assertEqual(
+            config["frontend"]["results_cache"]["memcached"]["addresses"], "memcached:11211"
+        )
+        self.assertEqual(config["frontend"]["split_queries_by_interval"], "6h")
+        self.assertTrue(config["frontend"]["parallelize_shardable_queries"])
+
+        runtime = yaml.safe_load(container.pull(MIMIR_RUNTIME_CONFIG_FILE))
+        self.assertEqual(runtime["overrides"]["anonymous"]["query_sharding_total_shards"], 8)
+
+    def test_memcached_sidecar_serves_caches_when_enabled(self):
+        self.harness.container_pebble_ready("memcached")
+        memcached = self.harness.charm.unit.get_container("memcached")
+        self.assertEqual(memcached.get_plan().services, {})
+
+        self.harness.update_config({"memcached": True, "index_cache_size": 128})
+        self.harness.container_pebble_ready(self.name)
+        services = memcached.get_plan().services
+        self.assertEqual(
+            set(services),
+            {"memcached-results", "memcached-index", "memcached-chunks", "memcached-metadata"},
+        )
+        self.assertIn("--memory-limit=128", services["memcached-index"].command)
+        self.assertTrue(memcached.get_service("memcached-index").is_running())
+
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        bucket_store = config["blocks_storage"]["bucket_store"]
+        self.assertEqual(bucket_store["index_cache"]["memcached"]["addresses"], "localhost:11212")
+        self.assertEqual(bucket_store["chunks_cache"]["subrange_ttl"], "24h")
+        self.assertIn("metadata_cache", bucket_store)
+        self.assertEqual(
+            config["frontend"]["results_cache"]["memcached"]["addresses"], "localhost:11211"
+        )
+
+        self.harness.update_config({"memcached": False})
+        self.assertFalse(memcached.get_service("memcached-index").is_running())
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertNotIn("index_cache", config["blocks_storage"]["bucket_store"])
+        self.assertFalse(config["frontend"]["cache_results"])
+
+    def test_charm_blocks_on_invalid_cache_sizes(self):
+        self.harness.container_pebble_ready(self.name)
+        self.harness.update_config({"memcached": True, "metadata_cache_size": 0})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+        # memcached requires items to fit in half the cache
+        self.harness.update_config({"metadata_cache_size": 1})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+        self.harness.update_config({"metadata_cache_size": 2})
+        self.assertIsInstance(self.harness.charm.unit.status, ActiveStatus)
+
+    def test_querier_lookback_follows_retention_period(self):
+        self.harness.update_config(
+            {"tsdb_block_retention_period": "12h", "querier_max_concurrent": 8}
+        )
+        self.harness.container_pebble_ready(self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(config["querier"]["query_store_after"], "10h")
+        self.assertEqual(config["querier"]["max_concurrent"], 8)
+        self.assertNotIn("prefer_streaming_chunks_from_store_gateways", config["querier"])
+
+        runtime = yaml.safe_load(container.pull(MIMIR_RUNTIME_CONFIG_FILE))
+        self.assertEqual(runtime["overrides"]["anonymous"]["query_ingesters_within"], "11h")
+
+        self.harness.update_config({"querier_query_store_after": "11h"})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_store_gateway_bucket_store_is_configured_from_config(self):
+        self.harness.update_config(
+            {
+                "memcached": True,
+                "store_gateway_sync_interval": "5m",
+                "store_gateway_lazy_loading_idle_timeout": "20m",
+            }
+        )
+        self.harness.container_pebble_ready(self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        bucket_store = config["blocks_storage"]["bucket_store"]
+        self.assertEqual(bucket_store["sync_dir"], MIMIR_DIRS["bucket_store"])
+        self.assertEqual(bucket_store["sync_interval"], "5m")
+        self.assertEqual(bucket_store["index_header"]["lazy_loading_idle_timeout"], "20m")
+        self.assertIn("index_cache", bucket_store)
+        self.assertNotIn("max_chunk_pool_bytes", bucket_store)
+
+        self.harness.update_config({"store_gateway_max_concurrent": 0})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_charm_warns_of_stale_bucket_index(self):
+        self.harness.update_config(
+            {"bucket_index_update_interval": "5m", "bucket_index_max_stale_period": "30m"}
+        )
+        self.harness.container_pebble_ready(self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(config["compactor"]["cleanup_interval"], "5m")
+        bucket_index = config["blocks_storage"]["bucket_store"]["bucket_index"]
+        self.assertEqual(bucket_index["max_stale_period"], "30m")
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus())
+
+        self.mock_bucket_index_updated_at.return_value = {"anonymous": time.time() - 3600}
+        self.harness.charm.on.update_status.emit()
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus("Bucket index is stale"))
+
+        self.mock_bucket_index_updated_at.return_value = {"anonymous": time.time()}
+        self.harness.charm.on.update_status.emit()
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus())
+
+    def test_charm_blocks_if_bucket_index_may_become_stale(self):
+        self.harness.container_pebble_ready(self.name)
+        self.harness.update_config({"bucket_index_max_stale_period": "10m"})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_compactor_is_configured_from_config(self):
+        self.harness.update_config(
+            {
+                "compactor_concurrency": 4,
+                "compactor_block_ranges": "2h,12h,24h,168h",
+                "compactor_split_and_merge_shards": 2,
+            }
+        )
+        self.harness.container_pebble_ready(self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(config["compactor"]["compaction_concurrency"], 4)
+        self.assertEqual(config["compactor"]["block_ranges"], ["2h", "12h", "24h", "168h"])
+        self.assertEqual(config["compactor"]["sharding_ring"]["kvstore"]["store"], "memberlist")
+
+        runtime = yaml.safe_load(container.pull(MIMIR_RUNTIME_CONFIG_FILE))
+        limits = runtime["overrides"]["anonymous"]
+        self.assertEqual(limits["compactor_split_and_merge_shards"], 2)
+        self.assertEqual(limits["compactor_split_groups"], 1)
+
+    def test_blocks_retention_period_is_set_globally_and_per_tenant(self):
+        self.harness.update_config(
+            {
+                "blocks_retention_period": "30d",
+                "tenant_overrides": "team-a: {compactor_blocks_retention_period: 90d}",
+            }
+        )
+        self.harness.container_pebble_ready(self.name)
+        container = self.harness.charm.unit.get_container(self.name)
+        runtime = yaml.safe_load(container.pull(MIMIR_RUNTIME_CONFIG_FILE))
+        overrides = runtime["overrides"]
+        self.assertEqual(overrides["anonymous"]["compactor_blocks_retention_period"], "30d")
+        self.assertEqual(overrides["team-a"]["compactor_blocks_retention_period"], "90d")
+
+        self.harness.update_config({"blocks_retention_period": "12h"})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_profile_tunes_options_left_at_their_defaults(self):
+        container = self.harness.charm.unit.get_container(self.name)
+        self.harness.set_can_connect(container, True)
+        container.push("/sys/fs/cgroup/cpu.max", "800000 100000", make_dirs=True)
+        container.push("/sys/fs/cgroup/memory.max", str(16 * 1024**3), make_dirs=True)
+        self.harness.update_config({"profile": "large", "querier_max_concurrent": 10})
+        self.harness.container_pebble_ready(self.name)
+
+        config = yaml.safe_load(container.pull(MIMIR_CONFIG_FILE))
+        self.assertEqual(config["querier"]["max_concurrent"], 10)
+        self.assertEqual(config["blocks_storage"]["bucket_store"]["max_concurrent"], 200)
+        self.assertEqual(config["server"]["grpc_server_max_recv_msg_size"], 256 * 1024**2)
+        self.assertEqual(config["ingester"]["ring"]["heartbeat_period"], "30s")
+
+        runtime = yaml.safe_load(container.pull(MIMIR_RUNTIME_CONFIG_FILE))
+        self.assertEqual(runtime["overrides"]["anonymous"]["ingestion_rate"], 200000.0)
+
+        self.harness.update_config({"profile": "huge"})
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_configuration_is_rendered_once_per_config_change(self):
+        self.harness.container_pebble_ready(self.name)
+        charm = self.harness.charm
+        with patch.object(charm, "_mimir_config", wraps=charm._mimir_config) as mock_render:
+            with patch("charm.cpu_limit", return_value=None) as mock_cpu_limit:
+                self.harness.update_config({"querier_max_concurrent": 7})
+                self.assertEqual(mock_render.call_count, 1)
+                # container limits are read only once by the charm
+                self.assertFalse(mock_cpu_limit.called)
+
+    def test_go_runtime_is_tuned_to_container_limits(self):
+        container = self.harness.charm.unit.get_container(self.name)
+        self.harness.set_can_connect(container, True)
+        container.push("/sys/fs/cgroup/cpu.max", "250000 100000", make_dirs=True)
+        container.push("/sys/fs/cgroup/memory.max", str(4 * 1024**3), make_dirs=True)
+        self.harness.container_pebble_ready(self.name)
+
+        service = self.harness.get_container_pebble_plan(self.name).services[self.name]
+        self.assertEqual(service.environment["GOMAXPROCS"], "3")
+        self.assertEqual(service.environment["GOMEMLIMIT"], str(int(4 * 1024**3 * 0.9)))
+        self.assertTrue(container.get_service(self.name).is_running())
+
+        self.harness.update_config({"go_memory_limit": "2GiB", "go_gc": 50})
+        service = self.harness.get_container_pebble_plan(self.name).services[self.name]
+        self.assertEqual(service.environment["GOMEMLIMIT"], "2GiB")
+        self.assertEqual(service.environment["GOGC"], "50")
+
     def test_charm_blocks_on_replication_without_object_storage(self):
         # a single peer unit is active regardless of object storage availability
         self.harness.container_pebble_ready(self.name)
@@ -171,6 +838,59 @@ class TestCharm(unittest.TestCase):
                 # check Mimir charm sets alert rules after relation data is set
                 self.assertTrue(mock_set_rules.called)
 
+    def _begin_with_target(self, target):
+        """Replace the harness with one whose charm runs the given target."""
+        self.harness.cleanup()
+        self.harness = Harness(MimirCharm)
+        self.harness.set_model_name("charm_test")
+        self.addCleanup(self.harness.cleanup)
+        self.harness.update_config({"target": target})
+        with patch("charm.KubernetesServicePatch", lambda *args: None):
+            self.harness.begin()
+        self.harness.container_pebble_ready(self.name)
+
+    @patch_network_get(private_address="10.1.1.2")
+    def test_read_target_provides_grafana_source_but_not_remote_write(self):
+        self._begin_with_target("read")
+        self.harness.add_relation(self.peername, self.name)
+        self.harness.set_leader(True)
+
+        remote_write_rel_id = self.harness.add_relation("receive-remote-write", "grafana-agent")
+        self.harness.add_relation_unit(remote_write_rel_id, "grafana-agent/0")
+        unit_data = self.harness.get_relation_data(remote_write_rel_id, "mimir-k8s/0")
+        self.assertNotIn("remote_write", unit_data)
+
+        grafana_rel_id = self.harness.add_relation("grafana-source", "grafana")
+        self.harness.add_relation_unit(grafana_rel_id, "grafana/0")
+        app_data = self.harness.get_relation_data(grafana_rel_id, "mimir-k8s")
+        self.assertIn("grafana_source_data", app_data)
+
+    @patch_network_get(private_address="10.1.1.2")
+    def test_write_target_provides_remote_write_but_no_grafana_source_or_rules(self):
+        self._begin_with_target("write")
+        self.harness.add_relation(self.peername, self.name)
+        self.harness.set_leader(True)
+
+        grafana_rel_id = self.harness.add_relation("grafana-source", "grafana")
+        self.harness.add_relation_unit(grafana_rel_id, "grafana/0")
+        app_data = self.harness.get_relation_data(grafana_rel_id, "mimir-k8s")
+        self.assertNotIn("grafana_source_data", app_data)
+
+        remote_write_rel_id = self.harness.add_relation("receive-remote-write", "grafana-agent")
+        self.harness.add_relation_unit(remote_write_rel_id, "grafana-agent/0")
+        unit_data = self.harness.get_relation_data(remote_write_rel_id, "mimir-k8s/0")
+        self.assertIn("remote_write", unit_data)
+
+        # alert rules are not loaded without a ruler
+        with open(CPU_OVER_USE_RULE_FILE) as rule_file:
+            with patch.object(
+                self.harness.charm._alertmanager, "set_alert_rule_group"
+            ) as mock_set_rules:
+                self.harness.update_relation_data(
+                    remote_write_rel_id, "grafana-agent", {"alert_rules": rule_file.read()}
+                )
+                self.assertFalse(mock_set_rules.called)
+
     @patch_network_get(private_address="10.1.1.2")
     def test_remote_write_relation_is_eventually_handled(self):
         # check charm is not active yet
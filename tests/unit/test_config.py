@@ -0,0 +1,163 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+from mimir.config import (
+    cache_config,
+    compactor_config,
+    distributor_instance_limits,
+    frontend_config,
+    go_runtime_environment,
+    ingester_config,
+    ingester_instance_limits,
+    limits_config,
+    parse_duration,
+    querier_lookback,
+    replication_factor,
+    runtime_overrides_config,
+    target_components,
+    tenant_overrides,
+    tsdb_config,
+)
+
+
+class TestConfig(unittest.TestCase):
+    def test_parsing_durations(self):
+        self.assertEqual(parse_duration("90s"), 90)
+        self.assertEqual(parse_duration("1h30m"), 5400)
+        self.assertEqual(parse_duration("500ms"), 0.5)
+        for invalid in ["", "10", "1x", "h"]:
+            with self.assertRaises(ValueError):
+                parse_duration(invalid)
+
+    def test_target_groups_are_expanded(self):
+        self.assertEqual(target_components("write"), {"distributor", "ingester"})
+        self.assertIn("alertmanager", target_components("all,alertmanager"))
+        with self.assertRaises(ValueError):
+            target_components("all,nonsense")
+
+    def test_replication_factor_never_exceeds_units(self):
+        self.assertEqual(replication_factor(1), 1)
+        self.assertEqual(replication_factor(2), 1)
+        self.assertEqual(replication_factor(2, 3), 1)
+        self.assertEqual(replication_factor(9), 3)
+        self.assertEqual(replication_factor(9, 5), 5)
+        self.assertEqual(replication_factor(9, 4), 3)
+
+    def test_tsdb_config_is_validated(self):
+        cfg = tsdb_config(wal_replay_concurrency=4, ship_interval="30s")
+        self.assertEqual(cfg["wal_replay_concurrency"], 4)
+        self.assertEqual(cfg["ship_interval"], "30s")
+        with self.assertRaises(ValueError):
+            tsdb_config(wal_replay_concurrency=-1)
+        with self.assertRaises(ValueError):
+            tsdb_config(wal_segment_size=1024)
+        with self.assertRaises(ValueError):
+            tsdb_config(head_compaction_interval="1h")
+        with self.assertRaises(ValueError):
+            tsdb_config(ship_interval="soon")
+
+    def test_limits_config_is_validated(self):
+        cfg = limits_config(max_global_series_per_user=1000, max_total_query_length="32d")
+        self.assertEqual(cfg["max_global_series_per_user"], 1000)
+        self.assertEqual(cfg["max_total_query_length"], "32d")
+        with self.assertRaises(ValueError):
+            limits_config(ingestion_rate=0)
+        with self.assertRaises(ValueError):
+            limits_config(ingestion_rate=1000, ingestion_burst_size=10)
+        with self.assertRaises(ValueError):
+            limits_config(max_fetched_series_per_query=-1)
+        with self.assertRaises(ValueError):
+            limits_config(max_total_query_length="forever")
+
+    def test_tenant_overrides_take_precedence_over_default_limits(self):
+        overrides = tenant_overrides(
+            "{anonymous: {ingestion_rate: 5}, team-a: {ingestion_rate: 1}}"
+        )
+        cfg = runtime_overrides_config(
+            {"ingestion_rate": 10, "ingestion_burst_size": 20}, overrides
+        )
+        self.assertEqual(
+            cfg["overrides"]["anonymous"], {"ingestion_rate": 5, "ingestion_burst_size": 20}
+        )
+        self.assertEqual(cfg["overrides"]["team-a"], {"ingestion_rate": 1})
+        with self.assertRaises(ValueError):
+            tenant_overrides("[1, 2]")
+        with self.assertRaises(ValueError):
+            tenant_overrides("{team-a: 1}")
+
+    def test_instance_limits_are_derived_from_memory_limit(self):
+        gib = 1024**3
+        cfg = ingester_instance_limits(memory_limit=4 * gib)
+        self.assertEqual(cfg["max_series"], 419430)
+        self.assertEqual(cfg["max_inflight_push_requests"], 8192)
+        self.assertEqual(cfg["max_tenants"], 0)
+
+        cfg = ingester_instance_limits(memory_limit=4 * gib, max_series=0, max_tenants=10)
+        self.assertEqual(cfg["max_series"], 0)
+        self.assertEqual(cfg["max_tenants"], 10)
+
+        cfg = distributor_instance_limits()
+        self.assertEqual(cfg["max_inflight_push_requests"], 0)
+
+        with self.assertRaises(ValueError):
+            ingester_instance_limits(max_series=-2)
+        with self.assertRaises(ValueError):
+            distributor_instance_limits(max_ingestion_rate=-1)
+
+    def test_ingester_ring_is_zone_aware_only_with_a_zone(self):
+        ring = ingester_config("10.0.0.1", 3)["ring"]
+        self.assertNotIn("zone_awareness_enabled", ring)
+        ring = ingester_config("10.0.0.1", 3, zone="zone-a")["ring"]
+        self.assertTrue(ring["zone_awareness_enabled"])
+        self.assertEqual(ring["instance_availability_zone"], "zone-a")
+
+    def test_query_frontend_caches_results_only_with_a_cache(self):
+        cfg = frontend_config({}, split_queries_by_interval="12h")
+        self.assertFalse(cfg["cache_results"])
+        self.assertNotIn("results_cache", cfg)
+        self.assertEqual(cfg["split_queries_by_interval"], "12h")
+
+        cache = cache_config("memcached-0:11211, dns+memcached.svc:11211")
+        self.assertEqual(
+            cache["memcached"]["addresses"], "memcached-0:11211,dns+memcached.svc:11211"
+        )
+        cfg = frontend_config({}, results_cache=cache)
+        self.assertTrue(cfg["cache_results"])
+        self.assertEqual(cfg["results_cache"], cache)
+
+        with self.assertRaises(ValueError):
+            cache_config("memcached")
+        with self.assertRaises(ValueError):
+            frontend_config({}, split_queries_by_interval="daily")
+        with self.assertRaises(ValueError):
+            frontend_config({}, max_outstanding_per_tenant=0)
+
+    def test_querier_lookback_is_derived_from_retention_period(self):
+        self.assertEqual(querier_lookback("24h"), ("23h", "22h"))
+        self.assertEqual(querier_lookback("24h", query_ingesters_within="13h"), ("13h", "12h"))
+        self.assertEqual(querier_lookback("90m"), ("30m", "0s"))
+        with self.assertRaises(ValueError):
+            querier_lookback("24h", query_ingesters_within="48h")
+        with self.assertRaises(ValueError):
+            querier_lookback("24h", query_ingesters_within="13h", query_store_after="14h")
+
+    def test_compactor_block_ranges_are_validated(self):
+        cfg = compactor_config("mimir-0", block_ranges="2h, 12h, 24h, 168h")
+        self.assertEqual(cfg["block_ranges"], ["2h", "12h", "24h", "168h"])
+        with self.assertRaises(ValueError):
+            compactor_config("mimir-0", block_ranges="1h,12h")
+        with self.assertRaises(ValueError):
+            compactor_config("mimir-0", block_ranges="2h,12h,20h")
+        with self.assertRaises(ValueError):
+            compactor_config("mimir-0", compaction_concurrency=0)
+
+    def test_go_runtime_environment_follows_resource_limits(self):
+        self.assertEqual(go_runtime_environment(), {"GOGC": "100"})
+        env = go_runtime_environment(cpus=1.5, memory=1000)
+        self.assertEqual(env, {"GOGC": "100", "GOMAXPROCS": "2", "GOMEMLIMIT": "900"})
+        env = go_runtime_environment(cpus=1.5, gomaxprocs=4, gomemlimit="3GiB", gogc=-1)
+        self.assertEqual(env, {"GOGC": "off", "GOMAXPROCS": "4", "GOMEMLIMIT": "3GiB"})
+        with self.assertRaises(ValueError):
+            go_runtime_environment(gomemlimit="3 gigabytes")
@@ -0,0 +1,26 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+from mimir.profiles import MIB, profile_options
+
+
+class TestProfiles(unittest.TestCase):
+    def test_custom_profile_sets_no_options(self):
+        self.assertEqual(profile_options("custom", cpus=8, memory=16384 * MIB), {})
+
+    def test_profiles_scale_with_container_resources(self):
+        nominal = profile_options("medium")
+        self.assertEqual(nominal["querier_max_concurrent"], 16)
+        self.assertEqual(nominal["index_cache_size"], 819)
+
+        scaled = profile_options("medium", cpus=8, memory=16384 * MIB)
+        self.assertEqual(scaled["querier_max_concurrent"], 32)
+        self.assertEqual(scaled["compactor_concurrency"], 2)
+        self.assertEqual(scaled["index_cache_size"], 1638)
+        self.assertEqual(scaled["query_sharding_total_shards"], 16)
+
+    def test_unknown_profile_is_invalid(self):
+        with self.assertRaises(ValueError):
+            profile_options("huge")